@@ -1,49 +1,58 @@
 # agents/content_generation.py
-import json
+import io
+import orjson
 import hashlib
 import os
-from stability_sdk import client as stability_client
-from google.cloud import texttospeech_v1beta1 as texttospeech
-# from moviepy.editor import VideoFileClip, CompositeVideoClip, ImageClip, AudioFileClip, concatenate_videoclips # For video editing
-from moviepy.editor import *  # Import all for simplicity in blueprint, but be specific in production
-from moviepy.video.tools.subtitles import SubtitlesClip  # For subtitles if desired
-import random
+import re
+import subprocess
+from functools import cached_property, lru_cache
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# stability_sdk and google.cloud.texttospeech are heavy to import, so they are imported lazily
+# where used; article-only workers never pay for them.
 from config.settings import (
     MIN_ARTICLE_LENGTH_WORDS, MAX_ARTICLE_LENGTH_WORDS, AI_CONTENT_DISCLAIMER_TEXT,
-    AI_CONTENT_DISCLAIMER_ENABLED, NICHE_TOPIC, STABILITY_AI_API_KEY,
-    GCP_PROJECT_ID, VIDEO_GENERATION_SETTINGS, DATA_DIR
+    AI_CONTENT_DISCLAIMER_ENABLED, ARTICLE_LLM_COVERAGE_CHECK_ENABLED, NICHE_TOPIC, STABILITY_AI_API_KEY,
+    GCP_PROJECT_ID, VIDEO_GENERATION_SETTINGS, DATA_DIR, IMAGE_GENERATION_MAX_CONCURRENCY, LLM_BATCH_SIZE,
+    CONTENT_DEDUP_CHUNK_THRESHOLD, LLM_PROMPT_DATA_MAX_TOKENS, ARTICLE_SEMANTIC_DEDUP_MAX_COSINE_DISTANCE
 )
-from database.db_manager import DBManager
+from database.db_manager import get_db_manager
 from database.models import StructuredFact, GeneratedContent
 from utils.logger import setup_logger
-from utils.llm_interface import LLMInterface
-from utils.file_manager import save_content_file, save_json
+from utils.llm_interface import get_llm_interface, truncate_to_tokens
+from utils.file_manager import save_content_file, save_json, ensure_directory
+from utils.cache import LLMCache
+from utils.chunker import chunk_hashes
 from utils.prompt_templates import (
     ARTICLE_GENERATION_PROMPT_HI, ARTICLE_GENERATION_PROMPT_EN,
-    IMAGE_PROMPT_GENERATION_PROMPT, VIDEO_SCRIPT_SUMMARY_PROMPT
+    IMAGE_PROMPT_GENERATION_PROMPT_FN, ARTICLE_COVERAGE_CHECK_PROMPT_FN, VIDEO_SCRIPT_SUMMARY_PROMPT, make_formatter
 )
 
 logger = setup_logger("ContentGenerationAgent")
-db_manager = DBManager()
-llm_interface = LLMInterface()
-
-# Initialize Stability AI client for image generation
-stability_api = None
-if STABILITY_AI_API_KEY:
-    try:
-        stability_api = stability_client.StabilityInference(key=STABILITY_AI_API_KEY, verbose=True)
-        logger.info("Stability AI client initialized.")
-    except Exception as e:
-        logger.error(f"Failed to initialize Stability AI client: {e}")
-
-# Initialize Google Cloud Text-to-Speech client
-tts_client = None
-if GCP_PROJECT_ID:
-    try:
-        tts_client = texttospeech.TextToSpeechClient()
-        logger.info("Google Cloud Text-to-Speech client initialized.")
-    except Exception as e:
-        logger.error(f"Failed to initialize Google Cloud Text-to-Speech client: {e}")
+llm_interface = get_llm_interface()
+llm_cache = LLMCache()
+# Prompt renderers with the per-process settings bound once (see make_formatter), which also keeps
+# the instruction prefix of each prompt byte-identical across calls for provider prompt caching
+_ARTICLE_PROMPT_FIXED_FIELDS = {
+    "min_length": MIN_ARTICLE_LENGTH_WORDS,
+    "ai_disclaimer_text": AI_CONTENT_DISCLAIMER_TEXT if AI_CONTENT_DISCLAIMER_ENABLED else "",
+}
+_article_prompts = {  # language -> renderer
+    "hi": make_formatter(ARTICLE_GENERATION_PROMPT_HI, **_ARTICLE_PROMPT_FIXED_FIELDS),
+    "en": make_formatter(ARTICLE_GENERATION_PROMPT_EN, **_ARTICLE_PROMPT_FIXED_FIELDS),
+}
+_video_script_prompt = make_formatter(VIDEO_SCRIPT_SUMMARY_PROMPT,
+                                      max_duration_seconds=VIDEO_GENERATION_SETTINGS['max_duration_seconds'])
+
+_WORD_PATTERN = re.compile(r'\S+')
+
+
+@lru_cache(maxsize=256)
+def _keyword_pattern(lower_keywords: tuple[str, ...]) -> re.Pattern:
+    """Compiles (and caches) one alternation regex matching any of the given lowercase keywords."""
+    # Longest first, so the most specific keyword wins when keywords share a prefix
+    alternatives = sorted(lower_keywords, key=len, reverse=True)
+    return re.compile("|".join(re.escape(kw) for kw in alternatives))
 
 
 class ContentGenerationAgent:
@@ -52,67 +61,160 @@ class ContentGenerationAgent:
     from structured facts.
     """
 
+    @cached_property
+    def stability_api(self):
+        """Stability AI client for image generation, initialized on first use. None if unavailable."""
+        if not STABILITY_AI_API_KEY:
+            return None
+        try:
+            from stability_sdk import client as stability_client
+            stability_api = stability_client.StabilityInference(key=STABILITY_AI_API_KEY, verbose=True)
+            logger.info("Stability AI client initialized.")
+            return stability_api
+        except Exception as e:
+            logger.error(f"Failed to initialize Stability AI client: {e}")
+            return None
+
+    @cached_property
+    def tts_client(self):
+        """Google Cloud Text-to-Speech client, initialized on first use. None if unavailable."""
+        if not GCP_PROJECT_ID:
+            return None
+        try:
+            from google.cloud import texttospeech_v1beta1 as texttospeech
+            tts_client = texttospeech.TextToSpeechClient()
+            logger.info("Google Cloud Text-to-Speech client initialized.")
+            return tts_client
+        except Exception as e:
+            logger.error(f"Failed to initialize Google Cloud Text-to-Speech client: {e}")
+            return None
+
     def generate_article(self, structured_fact_id: int, target_language: str,
                          keywords: list[str] | None = None) -> int | None:
         """
         Generates a comprehensive article based on structured facts.
         Returns the ID of the GeneratedContent record, or None on failure/duplicate.
         """
-        structured_fact = db_manager.get_record_by_id(StructuredFact, structured_fact_id)
+        structured_fact = get_db_manager().get_record_by_id(StructuredFact, structured_fact_id)
         if not structured_fact:
             logger.error(f"Structured fact {structured_fact_id} not found for article generation.")
             return None
 
+        if self._skip_semantic_duplicate(structured_fact, target_language):
+            return None
+
         logger.info(f"Generating article for structured fact ID: {structured_fact_id} in {target_language}")
 
-        structured_data_json = json.dumps(structured_fact.data, indent=2, ensure_ascii=False)
+        prompt = self._build_article_prompt(structured_fact, target_language, keywords)
+        if not prompt:
+            return None
+
+        generated_text = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=MAX_ARTICLE_LENGTH_WORDS)
+        return self._save_generated_article(structured_fact, target_language, keywords, generated_text)
+
+    def generate_articles_batch(self, jobs: list[tuple[int, str, list[str] | None]]) -> list[int | None]:
+        """
+        Batched variant of `generate_article` for (structured_fact_id, target_language, keywords) jobs.
+        Prompts are flushed to the LLM in groups of LLM_BATCH_SIZE instead of one call per fact.
+        Returns the GeneratedContent IDs in job order, with None for failed/duplicate jobs.
+        """
+        results = [None] * len(jobs)
+        pending = []  # (job index, structured fact, language, keywords, prompt)
+        for i, (structured_fact_id, target_language, keywords) in enumerate(jobs):
+            structured_fact = get_db_manager().get_record_by_id(StructuredFact, structured_fact_id)
+            if not structured_fact:
+                logger.error(f"Structured fact {structured_fact_id} not found for article generation.")
+                continue
+            if self._skip_semantic_duplicate(structured_fact, target_language):
+                continue
+            prompt = self._build_article_prompt(structured_fact, target_language, keywords)
+            if prompt:
+                pending.append((i, structured_fact, target_language, keywords, prompt))
+
+        for batch_start in range(0, len(pending), LLM_BATCH_SIZE):
+            batch = pending[batch_start:batch_start + LLM_BATCH_SIZE]
+            logger.info(f"Generating a batch of {len(batch)} articles.")
+            generated_texts = llm_interface.generate_batch([job[4] for job in batch], model_choice="gemini",
+                                                           max_tokens=MAX_ARTICLE_LENGTH_WORDS)
+            for (i, structured_fact, target_language, keywords, _), generated_text in zip(batch, generated_texts):
+                results[i] = self._save_generated_article(structured_fact, target_language, keywords,
+                                                          generated_text)
+        return results
+
+    def _skip_semantic_duplicate(self, structured_fact: StructuredFact, target_language: str) -> bool:
+        """
+        Checks for existing content generated from a semantically near-identical fact before spending an LLM
+        call. If found, the fact is marked processed (the existing article covers it) and True is returned.
+        """
+        if structured_fact.embedding is None:
+            return False
+        existing_content_id = get_db_manager().find_semantic_duplicate_content(
+            structured_fact.embedding, target_language, ARTICLE_SEMANTIC_DEDUP_MAX_COSINE_DISTANCE)
+        if existing_content_id is None:
+            return False
+        logger.info(f"Structured fact {structured_fact.id} is covered by existing content {existing_content_id} "
+                    f"(semantic match). Skipping generation.")
+        structured_fact.is_processed_for_content = True
+        get_db_manager().update_record(structured_fact)
+        return True
+
+    def _build_article_prompt(self, structured_fact: StructuredFact, target_language: str,
+                              keywords: list[str] | None) -> str | None:
+        """Builds the article generation prompt for a structured fact, or None for unsupported languages."""
+        structured_data_json = orjson.dumps(structured_fact.data,
+                                            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+        structured_data_json = truncate_to_tokens(structured_data_json, LLM_PROMPT_DATA_MAX_TOKENS)
         seo_keywords_str = ", ".join(keywords) if keywords else ""
 
         # Select appropriate prompt template based on language
-        if target_language == "hi":
-            prompt_template = ARTICLE_GENERATION_PROMPT_HI
-            lang_keywords_param = "seo_keywords_hindi"
-        elif target_language == "en":
-            prompt_template = ARTICLE_GENERATION_PROMPT_EN
-            lang_keywords_param = "seo_keywords_english"
-        else:
+        if target_language not in _article_prompts:
             logger.error(f"Unsupported target language for article generation: {target_language}")
             return None
+        return _article_prompts[target_language](structured_data_json=structured_data_json,
+                                                 seo_keywords=seo_keywords_str)
 
-        disclaimer_text = AI_CONTENT_DISCLAIMER_TEXT if AI_CONTENT_DISCLAIMER_ENABLED else ""
-
-        prompt = prompt_template.format(
-            structured_data_json=structured_data_json,
-            **{lang_keywords_param: seo_keywords_str},
-            min_length=MIN_ARTICLE_LENGTH_WORDS,
-            ai_disclaimer_text=disclaimer_text
-        )
-
-        generated_text = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=MAX_ARTICLE_LENGTH_WORDS)
+    def _save_generated_article(self, structured_fact: StructuredFact, target_language: str,
+                                keywords: list[str] | None, generated_text: str | None) -> int | None:
+        """
+        Quality-checks, deduplicates and stores an LLM-generated article for a structured fact.
+        Returns the ID of the GeneratedContent record, or None on failure/duplicate.
+        """
+        structured_fact_id = structured_fact.id
         if not generated_text:
             logger.error(f"Failed to generate text for structured fact ID: {structured_fact_id}. LLM response empty.")
             structured_fact.is_processed_for_content = False  # Mark as not processed if generation failed
-            db_manager.update_record(structured_fact)
+            structured_fact.claimed_at = None  # Release the claim so the next trigger run picks it up again
+            get_db_manager().update_record(structured_fact)
             return None
 
         # Basic AI-powered quality check (can be expanded)
         if not self._perform_article_quality_check(generated_text, structured_fact.data, keywords):
             logger.warning(f"Generated article for {structured_fact_id} failed quality check. Not saving.")
             structured_fact.is_processed_for_content = False
-            db_manager.update_record(structured_fact)
+            structured_fact.claimed_at = None
+            get_db_manager().update_record(structured_fact)
             return None
 
         # Calculate content hash for deduplication
-        content_hash = hashlib.md5(generated_text.encode('utf-8')).hexdigest()
-        if db_manager.is_content_hash_exists(content_hash):
+        content_hash = hashlib.sha256(generated_text.encode('utf-8')).hexdigest()
+        if get_db_manager().is_content_hash_exists(content_hash):
             logger.info(f"Generated article for {structured_fact_id} is a duplicate (content hash). Skipping.")
             structured_fact.is_processed_for_content = True  # Mark as processed, as we've seen this content before
-            db_manager.update_record(structured_fact)
+            get_db_manager().update_record(structured_fact)
+            return None
+
+        # Content-defined chunking catches near-duplicates that differ by a few edited lines
+        article_chunk_hashes = chunk_hashes(generated_text)
+        if get_db_manager().is_near_duplicate_content(article_chunk_hashes, CONTENT_DEDUP_CHUNK_THRESHOLD):
+            logger.info(f"Generated article for {structured_fact_id} is a near-duplicate (content chunks). Skipping.")
+            structured_fact.is_processed_for_content = True
+            get_db_manager().update_record(structured_fact)
             return None
 
         # Extract title from generated text (assuming LLM puts it in H1)
         # This is a simple heuristic; more robust parsing might be needed.
-        title_match = generated_text.split('\n')[0].replace('#', '').strip()
+        first_line, _, _ = generated_text.partition('\n')  # Only scans up to the first newline
+        title_match = first_line.replace('#', '').strip()
         if not title_match:
             title_match = f"{NICHE_TOPIC} Guide {structured_fact_id}"  # Fallback title
 
@@ -123,20 +225,22 @@ class ContentGenerationAgent:
             content_type="ARTICLE",
             keywords=keywords,
             content_hash=content_hash,
-            status="GENERATED"
+            status="GENERATED",
+            source_embedding=structured_fact.embedding
         )
-        inserted_content = db_manager.insert_record(generated_content)
+        # Content, chunk hashes and the fact's processed flag are written in a single transaction
+        inserted_content_id = get_db_manager().insert_content_and_mark_fact_processed(
+            generated_content, structured_fact_id, article_chunk_hashes)
 
-        if inserted_content:
-            structured_fact.is_processed_for_content = True  # Mark as processed
-            db_manager.update_record(structured_fact)
+        if inserted_content_id:
             logger.info(
-                f"Successfully generated and saved article for {structured_fact_id}. Content ID: {inserted_content.id}")
-            return inserted_content.id
+                f"Successfully generated and saved article for {structured_fact_id}. Content ID: {inserted_content_id}")
+            return inserted_content_id
         else:
             logger.error(f"Failed to save generated content for {structured_fact_id} to DB.")
             structured_fact.is_processed_for_content = False
-            db_manager.update_record(structured_fact)
+            structured_fact.claimed_at = None
+            get_db_manager().update_record(structured_fact)
             return None
 
     def generate_images_for_content(self, generated_content_id: int) -> list[str]:
@@ -144,64 +248,70 @@ class ContentGenerationAgent:
         Generates illustrative images based on article content using Stability AI.
         Returns a list of local file paths to generated images.
         """
-        generated_content = db_manager.get_record_by_id(GeneratedContent, generated_content_id)
+        generated_content = get_db_manager().get_record_by_id(GeneratedContent, generated_content_id)
         if not generated_content:
             logger.error(f"Generated content {generated_content_id} not found for image generation.")
             return []
 
         logger.info(f"Generating images for content ID: {generated_content_id}")
 
-        if not stability_api:
+        if not self.stability_api:
             logger.warning("Stability AI not initialized. Skipping image generation.")
             return []
+        from stability_sdk import client as stability_client
 
         # Use LLM to extract key visual concepts from the article text
-        prompt = IMAGE_PROMPT_GENERATION_PROMPT.format(article_text=generated_content.body_html[:5000])
-        image_prompts_json = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=500, temperature=0.5)
+        # Cached: regenerating images for the same article reuses the extracted concepts
+        article_text = generated_content.body_html[:5000]
+        prompt = IMAGE_PROMPT_GENERATION_PROMPT_FN(article_text=article_text)
+        cache_key = LLMCache.make_key("image_prompts", "gemini", article_text)
+        image_prompts_json = llm_cache.generate_text(llm_interface, cache_key, prompt, model_choice="gemini",
+                                                     max_tokens=500, temperature=0.5)
 
         image_prompts = []
         try:
-            image_prompts = json.loads(image_prompts_json)
+            image_prompts = orjson.loads(image_prompts_json)
             if not isinstance(image_prompts, list): raise ValueError("Expected list of image prompts.")
-        except (json.JSONDecodeError, ValueError):
+        except (orjson.JSONDecodeError, ValueError):
             logger.warning(f"Could not parse image prompts JSON for {generated_content_id}. Generating default images.")
             # Fallback to a default, generic prompt
             image_prompts = [{"concept": generated_content.title,
                               "prompt": f"A farmer checking a small solar water pump system in a field in Rajasthan, India, sunny day, realistic, high detail."}]
 
+        prompt_texts = [img_prompt_data.get("prompt", f"Illustration for {img_prompt_data.get('concept', 'content')}")
+                        for img_prompt_data in image_prompts]
+        # Random 32-bit seed per prompt for variety, drawn from a single OS entropy read
+        seed_bytes = os.urandom(4 * len(prompt_texts))
+        seeds = [int.from_bytes(seed_bytes[i:i + 4], 'little') for i in range(0, len(seed_bytes), 4)]
+        responses = self._generate_stability_images(
+            prompt_texts,
+            seeds=seeds,
+            width=768,  # Recommended size for web
+            height=768,
+            steps=50,  # Number of diffusion steps
+            cfg_scale=7.0,  # Classifier-free guidance scale
+            samples=1  # Number of images to generate
+        )
+
         generated_image_paths = []
-        for i, img_prompt_data in enumerate(image_prompts):
-            prompt_text = img_prompt_data.get("prompt", f"Illustration for {img_prompt_data.get('concept', 'content')}")
-            try:
-                # Stability AI generation call
-                response = stability_api.generate(
-                    prompt=prompt_text,
-                    width=768,  # Recommended size for web
-                    height=768,
-                    steps=50,  # Number of diffusion steps
-                    cfg_scale=7.0,  # Classifier-free guidance scale
-                    samples=1,  # Number of images to generate
-                    seed=random.randint(0, 4294967295)  # Random seed for variety
-                )
-
-                for artifact in response.artifacts:
-                    if artifact.finish_reason == stability_client.FinishReason.FILTER:
-                        logger.warning(f"Image generation filtered for {prompt_text} (content policy).")
-                        continue
-                    if artifact.type == stability_client.ArtifactType.IMAGE:
-                        img_filename = f"{generated_content_id}_img_{i}_{hashlib.md5(prompt_text.encode()).hexdigest()[:8]}.png"
-                        img_path = save_content_file(artifact.binary, img_filename,
-                                                     directory=f"content_assets/images/{generated_content_id}",
-                                                     binary_mode=True)
-                        generated_image_paths.append(img_path)
-                        logger.info(f"Generated image for {generated_content.id}: {img_path}")
-            except Exception as e:
-                logger.error(
-                    f"Stability AI image generation error for {generated_content_id} with prompt '{prompt_text}': {e}")
+        for i, (prompt_text, response) in enumerate(zip(prompt_texts, responses)):
+            if response is None:
+                continue
+            for artifact in response.artifacts:
+                if artifact.finish_reason == stability_client.FinishReason.FILTER:
+                    logger.warning(f"Image generation filtered for {prompt_text} (content policy).")
+                    continue
+                if artifact.type == stability_client.ArtifactType.IMAGE:
+                    img_filename = f"{generated_content_id}_img_{i}_{hashlib.md5(prompt_text.encode()).hexdigest()[:8]}.png"
+                    img_path = save_content_file(artifact.binary, img_filename,
+                                                 directory=f"content_assets/images/{generated_content_id}",
+                                                 binary_mode=True)
+                    generated_image_paths.append(img_path)
+                    logger.info(f"Generated image for {generated_content.id}: {img_path}")
 
         # Update GeneratedContent with image paths
         generated_content.associated_images = generated_image_paths
-        db_manager.update_record(generated_content)
+        get_db_manager().update_record(generated_content)
         return generated_image_paths
 
     def generate_video_for_content(self, generated_content_id: int) -> str | None:
@@ -209,23 +319,24 @@ class ContentGenerationAgent:
         Generates a short explainer video based on key points from the content.
         This is a complex module, simplified for blueprint.
         """
-        generated_content = db_manager.get_record_by_id(GeneratedContent, generated_content_id)
+        generated_content = get_db_manager().get_record_by_id(GeneratedContent, generated_content_id)
         if not generated_content:
             logger.error(f"Generated content {generated_content_id} not found for video generation.")
             return None
 
         logger.info(f"Generating video for content ID: {generated_content_id}")
 
-        if not tts_client:
+        if not self.tts_client:
             logger.warning("Google Cloud Text-to-Speech not initialized. Skipping video generation.")
             return None
-        if not stability_api:
+        if not self.stability_api:
             logger.warning("Stability AI not initialized for video visuals. Skipping video generation.")
             return None
+        from google.cloud import texttospeech_v1beta1 as texttospeech
+        from stability_sdk import client as stability_client
 
         # 1. Summarize content into a video script using LLM
-        prompt = VIDEO_SCRIPT_SUMMARY_PROMPT.format(
-            max_duration_seconds=VIDEO_GENERATION_SETTINGS['max_duration_seconds'],
+        prompt = _video_script_prompt(
             language_name=generated_content.language,
             article_text=generated_content.body_html[:5000]
         )
@@ -234,94 +345,200 @@ class ContentGenerationAgent:
             logger.error(f"Failed to generate video script for {generated_content_id}.")
             return None
 
-        # 2. Convert script to audio
-        language_code = VIDEO_GENERATION_SETTINGS['voice_language_code'].get(generated_content.language, 'en-IN')
-        voice_name = VIDEO_GENERATION_SETTINGS['voice_name'].get(generated_content.language, 'en-IN-Wavenet-D')
-
-        synthesis_input = texttospeech.SynthesisInput(text=video_script_text)
-        voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
-        audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
-
-        try:
-            tts_response = tts_client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
-            audio_filename = f"{generated_content_id}_narration.mp3"
-            audio_path = save_content_file(tts_response.audio_content, audio_filename,
-                                           directory=f"content_assets/audio/{generated_content_id}", binary_mode=True)
-            logger.info(f"Generated audio: {audio_path}")
-        except Exception as e:
-            logger.error(f"Google TTS error for {generated_content_id}: {e}")
-            return None
-
-        # 3. Generate visuals (simplified: create a few images and combine)
+        # 2. Generate visuals (simplified: create a few images and combine)
         # This is a simplified approach. A real system would parse script for scene changes.
+        # The visuals don't depend on the narration, so they are generated while TTS runs.
         visual_prompts_for_video = [
             f"A farmer looking at a solar pump in a field in Rajasthan, India, sunny day. ({generated_content.language})",
             f"Close-up of solar panels being cleaned. ({generated_content.language})",
             f"Diagram showing water flowing from a solar pump to crops. ({generated_content.language})",
             f"Farmers discussing a government scheme with documents. ({generated_content.language})"
         ]
-        video_clips = []
-        for i, v_prompt in enumerate(visual_prompts_for_video):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            visuals_future = executor.submit(self._generate_stability_images, visual_prompts_for_video,
+                                             width=1024, height=576, steps=30, samples=1)  # 16:9 aspect ratio
+
+            # 3. Convert script to audio
+            language_code = VIDEO_GENERATION_SETTINGS['voice_language_code'].get(generated_content.language, 'en-IN')
+            voice_name = VIDEO_GENERATION_SETTINGS['voice_name'].get(generated_content.language, 'en-IN-Wavenet-D')
+
+            synthesis_input = texttospeech.SynthesisInput(text=video_script_text)
+            voice = texttospeech.VoiceSelectionParams(language_code=language_code, name=voice_name)
+            audio_config = texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.MP3)
+
             try:
-                response = stability_api.generate(prompt=v_prompt, width=1024, height=576, steps=30,
-                                                  samples=1)  # 16:9 aspect ratio
-                for artifact in response.artifacts:
-                    if artifact.type == stability_client.ArtifactType.IMAGE:
-                        img_filename = f"{generated_content_id}_video_frame_{i}.png"
-                        img_path = save_content_file(artifact.binary, img_filename,
-                                                     directory=f"content_assets/video_frames/{generated_content_id}",
-                                                     binary_mode=True)
-                        video_clips.append(ImageClip(img_path))
-                        break  # Take the first image
+                tts_response = self.tts_client.synthesize_speech(input=synthesis_input, voice=voice,
+                                                            audio_config=audio_config)
+                audio_filename = f"{generated_content_id}_narration.mp3"
+                audio_path = save_content_file(tts_response.audio_content, audio_filename,
+                                               directory=f"content_assets/audio/{generated_content_id}",
+                                               binary_mode=True)
+                logger.info(f"Generated audio: {audio_path}")
             except Exception as e:
-                logger.error(
-                    f"Failed to generate video visual for {generated_content_id} with prompt '{v_prompt}': {e}")
-
-        if not video_clips:
+                logger.error(f"Google TTS error for {generated_content_id}: {e}")
+                return None
+
+            responses = visuals_future.result()
+
+        frames = []  # Raw RGB24 bytes of each slideshow image, all at the size of the first one
+        frame_size = None
+        for i, response in enumerate(responses):
+            if response is None:
+                continue
+            for artifact in response.artifacts:
+                if artifact.type == stability_client.ArtifactType.IMAGE:
+                    if VIDEO_GENERATION_SETTINGS['save_frames']:  # Debug only; frames are used from memory
+                        save_content_file(artifact.binary, f"{generated_content_id}_video_frame_{i}.png",
+                                          directory=f"content_assets/video_frames/{generated_content_id}",
+                                          binary_mode=True)
+                    # Decode the PNG once, in memory, straight to the raw pixels ffmpeg reads
+                    with Image.open(io.BytesIO(artifact.binary)) as frame_image:
+                        frame_image = frame_image.convert("RGB")
+                        if frame_size is None:
+                            frame_size = frame_image.size
+                        elif frame_image.size != frame_size:
+                            frame_image = frame_image.resize(frame_size)
+                        frames.append(frame_image.tobytes())
+                    break  # Take the first image
+
+        if not frames:
             logger.error(f"No visuals generated for video {generated_content_id}. Skipping video creation.")
             return None
 
-        # 4. Assemble video with MoviePy
+        # 4. Assemble video: stream the slideshow frames to ffmpeg as raw video
         try:
-            audio_clip = AudioFileClip(audio_path)
-
-            # Distribute audio duration across clips
-            clip_duration = audio_clip.duration / len(video_clips)
-            final_clips = [clip.set_duration(clip_duration).set_fps(24) for clip in
-                           video_clips]  # Set FPS for smooth video
-
-            final_video_clip = concatenate_videoclips(final_clips, method="compose")
-            final_video_clip = final_video_clip.set_audio(audio_clip)
+            # Distribute audio duration across images
+            fps = VIDEO_GENERATION_SETTINGS['fps']
+            frames_per_image = max(1, round(self._get_media_duration(audio_path) * fps / len(frames)))
 
             video_output_dir = os.path.join(DATA_DIR, f"content_assets/videos/{generated_content_id}")
-            os.makedirs(video_output_dir, exist_ok=True)
+            ensure_directory(video_output_dir)
             video_output_path = os.path.join(video_output_dir, f"{generated_content_id}_final.mp4")
 
-            final_video_clip.write_videofile(video_output_path, codec="libx264", audio_codec="aac", fps=24)
+            self._write_video_file(frames, frame_size, frames_per_image, audio_path, video_output_path)
             logger.info(f"Video generated at {video_output_path}")
 
             generated_content.associated_video_path = video_output_path
-            db_manager.update_record(generated_content)
+            get_db_manager().update_record(generated_content)
             return video_output_path
 
         except Exception as e:
             logger.error(f"Error assembling video for {generated_content_id}: {e}")
             return None
 
+    def _check_structured_data_coverage(self, text: str, structured_data: dict) -> bool:
+        """
+        Asks the LLM whether the article covers the key points of its structured data.
+        Answers are cached per (model, article prefix, data), so retries and re-checks skip the LLM call.
+        """
+        article_text = text[:2000]
+        structured_data_json = orjson.dumps(structured_data,
+                                            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+        prompt = ARTICLE_COVERAGE_CHECK_PROMPT_FN(article_text=article_text,
+                                                  structured_data_json=structured_data_json)
+        cache_key = LLMCache.make_key("coverage_check", "gemini", article_text, structured_data_json)
+        response = llm_cache.generate_text(llm_interface, cache_key, prompt, model_choice="gemini", max_tokens=10,
+                                           temperature=0.0)
+        return not (response and "NO" in response.upper())
+
+    def _get_media_duration(self, media_path: str) -> float:
+        """Returns the duration of an audio/video file in seconds, as reported by ffprobe."""
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", media_path],
+            capture_output=True, text=True, check=True
+        )
+        return float(result.stdout.strip())
+
+    def _write_video_file(self, frames: list[bytes], frame_size: tuple[int, int], frames_per_image: int,
+                          audio_path: str, output_path: str) -> None:
+        """
+        Encodes the slideshow with the configured (ideally hardware) H.264 encoder.
+        Falls back to the libx264 software encoder if the hardware encoder is unavailable on this host.
+        """
+        codec = VIDEO_GENERATION_SETTINGS['video_codec']
+        if codec != "libx264":
+            try:
+                self._encode_frames_with_ffmpeg(frames, frame_size, frames_per_image, audio_path, output_path, codec,
+                                                VIDEO_GENERATION_SETTINGS['hw_encoder_ffmpeg_params'].get(codec, []))
+                return
+            except Exception as e:
+                logger.warning(f"Hardware encoder '{codec}' failed ({e}). Falling back to libx264.")
+        self._encode_frames_with_ffmpeg(frames, frame_size, frames_per_image, audio_path, output_path, "libx264",
+                                        ["-threads", str(os.cpu_count() or 1)])
+
+    def _encode_frames_with_ffmpeg(self, frames: list[bytes], frame_size: tuple[int, int], frames_per_image: int,
+                                   audio_path: str, output_path: str, codec: str, codec_params: list[str]) -> None:
+        """
+        Pipes each frame `frames_per_image` times to ffmpeg's stdin as rawvideo and muxes in the narration.
+        Each frame buffer is written repeatedly as-is, so no per-frame Python compositing or copies happen.
+        """
+        width, height = frame_size
+        command = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+            "-r", str(VIDEO_GENERATION_SETTINGS['fps']), "-i", "-",
+            "-i", audio_path,
+            "-c:v", codec, *codec_params, "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-shortest", output_path
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            for frame in frames:
+                for _ in range(frames_per_image):
+                    process.stdin.write(frame)
+        except BrokenPipeError:
+            pass  # ffmpeg exited early; its error is reported below
+        _, stderr = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {process.returncode}: {stderr.decode(errors='replace')[-500:]}")
+
+    def _generate_stability_images(self, prompts: list[str], seeds: list[int] | None = None,
+                                   **generation_params) -> list:
+        """
+        Submits all prompts to Stability AI concurrently instead of one round-trip at a time.
+        Returns the responses in the same order as `prompts`, with None where a request failed.
+        """
+        responses = [None] * len(prompts)
+        if not prompts:
+            return responses
+
+        max_workers = min(len(prompts), IMAGE_GENERATION_MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for i, prompt_text in enumerate(prompts):
+                params = dict(generation_params)
+                if seeds is not None:
+                    params["seed"] = seeds[i]
+                futures[executor.submit(self.stability_api.generate, prompt=prompt_text, **params)] = i
+
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    responses[i] = future.result()
+                except Exception as e:
+                    logger.error(f"Stability AI image generation error with prompt '{prompts[i]}': {e}")
+        return responses
+
     def _perform_article_quality_check(self, text: str, structured_data: dict, keywords: list[str] | None) -> bool:
         """
         Performs basic quality checks on the generated article.
         Can be expanded with more sophisticated NLP checks.
         """
-        # 1. Length check
-        if len(text.split()) < MIN_ARTICLE_LENGTH_WORDS:
-            logger.warning(f"Quality check failed for length: Article too short ({len(text.split())} words).")
+        # 1. Length check (counts words in one pass without building a list of them)
+        word_count = sum(1 for _ in _WORD_PATTERN.finditer(text))
+        if word_count < MIN_ARTICLE_LENGTH_WORDS:
+            logger.warning(f"Quality check failed for length: Article too short ({word_count} words).")
             return False
 
         # 2. Basic keyword presence (optional, depending on strictness)
         if keywords:
-            text_lower = text.lower()
-            missing_keywords = [kw for kw in keywords if kw.lower() not in text_lower]
+            text_lower = text.lower()  # Lowercased once and shared by the keyword checks below
+            keyword_pattern = _keyword_pattern(tuple(sorted({kw.lower() for kw in keywords})))
+            found_keywords = set(keyword_pattern.findall(text_lower))  # Single scan for all keywords
+            # Matches don't overlap, so a keyword nested inside a longer matched keyword is re-checked directly
+            missing_keywords = [kw for kw in keywords
+                                if kw.lower() not in found_keywords and kw.lower() not in text_lower]
             if missing_keywords:
                 logger.warning(f"Quality check: Missing keywords in article: {missing_keywords}")
                 # return False # Uncomment if keywords are mandatory for quality
@@ -332,12 +549,9 @@ class ContentGenerationAgent:
             return False
 
         # 4. Check if main structured data points are covered (LLM-assisted check)
-        # This would involve another LLM call:
-        # prompt = f"Does the following article cover all the key points from this structured data? Article: {text[:2000]}, Data: {json.dumps(structured_data)}. Respond with YES/NO."
-        # response = llm_interface.generate_text(prompt)
-        # if response and "NO" in response.upper():
-        #     logger.warning("Quality check: Article does not cover all key structured data points.")
-        #     return False
+        if ARTICLE_LLM_COVERAGE_CHECK_ENABLED and not self._check_structured_data_coverage(text, structured_data):
+            logger.warning("Quality check: Article does not cover all key structured data points.")
+            return False
 
         return True
 
@@ -1,20 +1,25 @@
 # agents/data_ingestion.py
 import requests
-import json
-import hashlib
-import numpy as np  # For embedding operations
-from bs4 import BeautifulSoup  # For basic HTML parsing
-from config.settings import NICHE_TOPIC, NICHE_SCHEMA_PROMPT_SOLAR_PUMP_RAJA, BRIGHT_DATA_API_KEY, BRIGHT_DATA_HOST, \
-    BRIGHT_DATA_PORT, BRIGHT_DATA_ZONE
-from database.db_manager import DBManager
-from database.models import RawIngestedData, StructuredFact
+import orjson  # Fast C JSON parsing/serialization
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from selectolax.parser import HTMLParser  # Fast C (lexbor-based) HTML parsing
+from config.settings import NICHE_TOPIC, BRIGHT_DATA_API_KEY, BRIGHT_DATA_HOST, \
+    BRIGHT_DATA_PORT, BRIGHT_DATA_ZONE, LLM_BATCH_SIZE, MAX_HTML_BYTES, SCRAPE_MAX_CONCURRENCY, \
+    EMBEDDING_DEDUP_MAX_COSINE_DISTANCE
+from database.db_manager import get_db_manager
+from database.models import RawIngestedData
 from utils.logger import setup_logger
-from utils.llm_interface import LLMInterface
+from utils.llm_interface import get_llm_interface
+from utils.cache import CachedEmbedder, embedding_hash as compute_embedding_hash
+from utils.http_session import create_session
+from utils.compression import zstd_compress
+from utils.prompt_templates import RAW_DATA_EXTRACTION_PROMPT_FN
 from urllib.parse import urlparse
 
 logger = setup_logger("DataIngestionAgent")
-db_manager = DBManager()
-llm_interface = LLMInterface()
+llm_interface = get_llm_interface()
+embedder = CachedEmbedder(llm_interface)
 
 
 class DataIngestionAgent:
@@ -32,7 +37,8 @@ class DataIngestionAgent:
             "http": f"http://{self.proxy_user}:{self.proxy_pass}@{self.proxy_host}:{self.proxy_port}",
             "https": f"http://{self.proxy_user}:{self.proxy_pass}@{self.proxy_host}:{self.proxy_port}"
         }
-        self.session = requests.Session()
+        # Pool sized for concurrent scrapes so keep-alive connections to the proxy are reused
+        self.session = create_session(pool_maxsize=SCRAPE_MAX_CONCURRENCY)
         self.session.proxies = self.proxies
 
     def scrape_url(self, url: str) -> int | None:
@@ -40,111 +46,229 @@ class DataIngestionAgent:
         Scrapes a given URL using a proxy and stores the raw HTML.
         Returns the ID of the RawIngestedData record, or None on failure.
         """
-        if db_manager.is_raw_data_url_exists(url):
+        if get_db_manager().is_raw_data_url_exists(url):
             logger.info(f"URL already exists in raw data: {url}. Skipping scrape.")
             return None
 
+        raw_html = self._fetch_compressed_html(url)
+        if raw_html is None:
+            return None
+
+        # Claimed on insert: the record goes straight to the chained parse task, so the periodic
+        # process_all_unparsed_data_task must not claim and parse it as well
+        raw_record = RawIngestedData(url=url, raw_html=raw_html, status="NEW", claimed_at=datetime.utcnow())
+        inserted_record = get_db_manager().insert_record(raw_record)
+        if inserted_record:
+            logger.info(f"Successfully scraped and saved raw data for {url}. ID: {inserted_record.id}")
+            return inserted_record.id
+        logger.error(f"Failed to save raw data for {url} to DB.")
+        return None
+
+    def scrape_urls(self, urls: list[str]) -> list[int | None]:
+        """
+        Scrapes several URLs concurrently over the shared, pooled session.
+        Wall time is bounded by the slowest pages rather than the sum of all of them, and the
+        pages are stored with one batched INSERT instead of one transaction per URL.
+        Returns the RawIngestedData IDs in input order, with None for skipped/failed URLs.
+        """
+        existing = get_db_manager().existing_urls(urls)  # One query for all URLs
+        urls_to_fetch = []
+        for url in dict.fromkeys(urls):
+            if url in existing:
+                logger.info(f"URL already exists in raw data: {url}. Skipping scrape.")
+            else:
+                urls_to_fetch.append(url)
+        if not urls_to_fetch:
+            return [None] * len(urls)
+
+        with ThreadPoolExecutor(max_workers=min(len(urls_to_fetch), SCRAPE_MAX_CONCURRENCY)) as executor:
+            raw_htmls = list(executor.map(self._fetch_compressed_html, urls_to_fetch))
+
+        claimed_at = datetime.utcnow()  # Claimed on insert for the chained parse task (see scrape_url)
+        rows = [{"url": url, "raw_html": raw_html, "status": "NEW", "claimed_at": claimed_at}
+                for url, raw_html in zip(urls_to_fetch, raw_htmls) if raw_html is not None]
+        record_ids = get_db_manager().insert_raw_data_batch(rows)
+        logger.info(f"Scraped {len(rows)} of {len(urls_to_fetch)} URLs and saved {len(record_ids)} new raw data records.")
+        return [record_ids.get(url) for url in urls]
+
+    def _fetch_compressed_html(self, url: str) -> bytes | None:
+        """Fetches a URL and returns its HTML zstd-compressed for storage (compressed in the fetching thread)."""
+        raw_html = self._fetch_raw_html(url)
+        return zstd_compress(raw_html.encode("utf-8")) if raw_html is not None else None
+
+    def _fetch_raw_html(self, url: str) -> str | None:
+        """Fetches a URL through the proxy session. Returns the (size-capped) HTML, or None on failure."""
         logger.info(f"Attempting to scrape: {url}")
         try:
             # Use requests_html for JS rendering if needed, or a dedicated scraping API like Bright Data's Web Unlocker.
             # For simplicity, using basic requests with proxy.
             headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.88 Safari/537.36'
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.88 Safari/537.36',
+                'Accept-Encoding': 'gzip, deflate'  # requests decompresses transparently
             }
-            response = self.session.get(url, headers=headers, timeout=30)
+            response = self.session.get(url, headers=headers, timeout=30, stream=True)
             response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
 
-            raw_html = response.text
-
-            raw_record = RawIngestedData(url=url, raw_html=raw_html, status="NEW")
-            inserted_record = db_manager.insert_record(raw_record)
-            if inserted_record:
-                logger.info(f"Successfully scraped and saved raw data for {url}. ID: {inserted_record.id}")
-                return inserted_record.id
-            else:
-                logger.error(f"Failed to save raw data for {url} to DB.")
-                return None
+            return self._read_capped_html(response)
         except requests.exceptions.RequestException as e:
             logger.error(f"Scraping failed for {url} due to network/API error: {e}")
         except Exception as e:
             logger.error(f"Unexpected error during scraping for {url}: {e}")
         return None
 
+    def _read_capped_html(self, response: requests.Response) -> str:
+        """
+        Reads a streamed response body up to MAX_HTML_BYTES and decodes it once.
+        Oversized pages are truncated instead of being buffered (and stored) in full.
+        """
+        body = bytearray()
+        try:
+            for chunk in response.iter_content(chunk_size=65536):
+                body.extend(chunk)
+                if len(body) >= MAX_HTML_BYTES:
+                    logger.info(f"Response from {response.url} exceeds {MAX_HTML_BYTES} bytes. Truncating.")
+                    del body[MAX_HTML_BYTES:]
+                    break
+        finally:
+            response.close()
+
+        # Only trust the declared encoding if the server sent a charset; requests otherwise guesses ISO-8859-1
+        has_charset = 'charset' in response.headers.get('Content-Type', '').lower()
+        encoding = response.encoding if has_charset and response.encoding else 'utf-8'
+        return body.decode(encoding, errors='replace')
+
     def process_raw_data(self, raw_data_id: int) -> int | None:
         """
         Takes raw ingested data, parses and filters it using LLM,
         and stores as structured facts.
         Returns the ID of the StructuredFact record, or None on failure/duplicate.
         """
-        raw_record = db_manager.get_record_by_id(RawIngestedData, raw_data_id)
+        raw_record = get_db_manager().get_record_by_id(RawIngestedData, raw_data_id)
         if not raw_record:
             logger.error(f"Raw data record {raw_data_id} not found for processing.")
             return None
+        if raw_record.status != "NEW":  # Already handled, e.g. before a task retry
+            logger.info(f"Raw data record {raw_data_id} is already {raw_record.status}. Skipping.")
+            return None
 
         logger.info(f"Processing raw data from {raw_record.url}")
 
-        # Extract main content from HTML using BeautifulSoup to reduce noise for LLM
-        soup = BeautifulSoup(raw_record.raw_html, 'html.parser')
-        # Try to find main content area, e.g., <article>, <main>, or div with specific class
-        main_content_tag = soup.find('article') or soup.find('main') or soup.find('div', class_='main-content')
-        text_content = main_content_tag.get_text(separator='\n', strip=True) if main_content_tag else soup.get_text(
-            separator='\n', strip=True)
+        prompt = self._build_extraction_prompt(raw_record)
+        extracted_json_str = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=2000,
+                                                         temperature=0.2)
+        return self._store_structured_data(raw_record, extracted_json_str)
 
-        # Limit input to LLM token window (e.g., 15,000 characters for Gemini Pro)
-        llm_input_text = text_content[:15000]
+    def process_raw_data_batch(self, raw_data_ids: list[int]) -> list[int | None]:
+        """
+        Batched variant of `process_raw_data`.
+        Extraction prompts are flushed to the LLM in groups of LLM_BATCH_SIZE instead of one call per record.
+        Returns the StructuredFact IDs in input order, with None for failed/duplicate records.
+        """
+        results = [None] * len(raw_data_ids)
+        pending = []  # (input index, raw record, prompt)
+        raw_records = get_db_manager().get_records_by_ids(RawIngestedData, raw_data_ids)  # One SELECT for all
+        for i, raw_data_id in enumerate(raw_data_ids):
+            raw_record = raw_records.get(raw_data_id)
+            if not raw_record:
+                logger.error(f"Raw data record {raw_data_id} not found for processing.")
+                continue
+            if raw_record.status != "NEW":  # Already handled, e.g. before a task retry
+                logger.info(f"Raw data record {raw_data_id} is already {raw_record.status}. Skipping.")
+                continue
+            pending.append((i, raw_record, self._build_extraction_prompt(raw_record)))
 
-        prompt = f"""You are an expert in agricultural technology and government schemes in Rajasthan.
-        Extract the following structured information from the provided text, focusing specifically on small-scale solar pump systems, their maintenance, troubleshooting, and relevant government schemes for farmers in Rajasthan.
+        for batch_start in range(0, len(pending), LLM_BATCH_SIZE):
+            batch = pending[batch_start:batch_start + LLM_BATCH_SIZE]
+            logger.info(f"Processing a batch of {len(batch)} raw data records.")
+            extracted_json_strs = llm_interface.generate_batch([job[2] for job in batch], model_choice="gemini",
+                                                               max_tokens=2000, temperature=0.2)
+            self._prefetch_embeddings(extracted_json_strs)
+            for (i, raw_record, _), extracted_json_str in zip(batch, extracted_json_strs):
+                results[i] = self._store_structured_data(raw_record, extracted_json_str)
+        return results
 
-        **Niche Schema:**
-        {NICHE_SCHEMA_PROMPT_SOLAR_PUMP_RAJA}
+    def _prefetch_embeddings(self, extracted_json_strs: list[str | None]) -> None:
+        """
+        Embeds the parseable extraction results of a batch in one batched request, warming the embedder's
+        cache so `_store_structured_data` doesn't make one embedding call per record.
+        """
+        texts = []
+        for extracted_json_str in extracted_json_strs:
+            try:
+                structured_data = orjson.loads(extracted_json_str) if extracted_json_str else None
+            except orjson.JSONDecodeError:
+                continue  # Reported by _store_structured_data
+            if structured_data:
+                texts.append(self._embedding_text(structured_data))
+        if len(texts) > 1:
+            embedder.embed_text_many(texts)
 
-        **Raw Text Content:**
-        {llm_input_text}
+    @staticmethod
+    def _embedding_text(structured_data) -> str:
+        """Canonical text embedded for semantic deduplication of structured data."""
+        return orjson.dumps(structured_data, option=orjson.OPT_SORT_KEYS).decode()
 
-        Return the extracted data as a single JSON object. If a field is not found, omit that field from the JSON.
-        """
+    def _build_extraction_prompt(self, raw_record: RawIngestedData) -> str:
+        """Builds the structured-data extraction prompt from the main text content of a raw HTML record."""
+        # Extract main content from HTML using selectolax to reduce noise for LLM
+        tree = HTMLParser(raw_record.decoded_html)
+        tree.strip_tags(['script', 'style', 'noscript'])
+        # Try to find main content area, e.g., <article>, <main>, or div with specific class
+        main_content_node = tree.css_first('article') or tree.css_first('main') or tree.css_first('div.main-content')
+        if not main_content_node:
+            main_content_node = tree.body or tree.root
+        text_content = main_content_node.text(separator='\n', strip=True) if main_content_node else ""
 
-        extracted_json_str = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=2000,
-                                                         temperature=0.2)
+        # Limit input to LLM token window (e.g., 15,000 characters for Gemini Pro)
+        llm_input_text = text_content[:15000]
 
+        return RAW_DATA_EXTRACTION_PROMPT_FN(raw_text=llm_input_text)
+
+    def _store_structured_data(self, raw_record: RawIngestedData, extracted_json_str: str | None) -> int | None:
+        """
+        Validates, deduplicates and stores the LLM extraction result for a raw record.
+        Returns the ID of the StructuredFact record, or None on failure/duplicate.
+        """
         if not extracted_json_str:
             logger.error(f"Failed to extract structured data for {raw_record.url}. LLM response empty.")
             raw_record.status = "FAILED_PARSING"
-            db_manager.update_record(raw_record)
+            get_db_manager().update_record(raw_record)
             return None
 
         try:
-            structured_data = json.loads(extracted_json_str)
+            structured_data = orjson.loads(extracted_json_str)
             if not structured_data:
                 raise ValueError("LLM returned empty JSON object.")
 
             # Generate embedding for semantic deduplication
-            data_text_for_embedding = json.dumps(structured_data, sort_keys=True, ensure_ascii=False)
-            data_embedding = llm_interface.embed_text(data_text_for_embedding)
+            data_text_for_embedding = self._embedding_text(structured_data)
+            data_embedding = embedder.embed_text(data_text_for_embedding)
 
             if data_embedding is None:
                 logger.error(f"Failed to generate embedding for structured data from {raw_record.url}.")
                 raw_record.status = "FAILED_EMBEDDING"
-                db_manager.update_record(raw_record)
+                get_db_manager().update_record(raw_record)
                 return None
 
-            # Simple hash of embedding for quick lookup. For true semantic deduplication,
-            # you'd need a vector database (e.g., pgvector, Pinecone, Milvus) and similarity search.
-            embedding_hash = hashlib.md5(np.array(data_embedding).tobytes()).hexdigest()
+            # Hash of the quantized embedding for a quick O(1) exact-duplicate pre-check (stable across cache tiers)
+            embedding_hash = compute_embedding_hash(data_embedding)
 
-            if db_manager.is_embedding_hash_exists(embedding_hash):
+            # Exact duplicates by hash, then semantic near-duplicates by cosine distance (pgvector HNSW index)
+            db_manager = get_db_manager()
+            if db_manager.is_embedding_hash_exists(embedding_hash) or db_manager.is_near_duplicate_embedding(
+                    data_embedding, EMBEDDING_DEDUP_MAX_COSINE_DISTANCE):
                 logger.info(
-                    f"Structured data from {raw_record.url} is semantically similar (embedding hash). Skipping.")
+                    f"Structured data from {raw_record.url} is semantically similar (embedding distance). Skipping.")
                 raw_record.status = "DUPLICATE_PARSED"
-                db_manager.update_record(raw_record)
+                get_db_manager().update_record(raw_record)
                 return None
 
             # Determine language of the extracted data (can be refined with language detection libraries)
             # For now, assume based on content if it's Hindi or English
-            extracted_lang = "hi" if "योजना" in json.dumps(structured_data, ensure_ascii=False) else "en"
+            extracted_lang = "hi" if "योजना" in data_text_for_embedding else "en"
 
-            structured_fact = StructuredFact(
+            # One transaction: insert the fact (skipped on an embedding-hash duplicate) and update the raw status
+            inserted_fact_id = get_db_manager().upsert_fact_and_mark_processed(raw_record.id, dict(
                 source_url=raw_record.url,
                 niche_category=NICHE_TOPIC,
                 language=extracted_lang,
@@ -152,27 +276,24 @@ class DataIngestionAgent:
                 embedding=data_embedding,
                 embedding_hash=embedding_hash,
                 is_processed_for_content=False
-            )
-            inserted_fact = db_manager.insert_record(structured_fact)
+            ))
 
-            if inserted_fact:
-                raw_record.status = "PARSED"
-                db_manager.update_record(raw_record)
+            if inserted_fact_id:
                 logger.info(
-                    f"Successfully processed raw data and saved structured facts for {raw_record.url}. Fact ID: {inserted_fact.id}")
-                return inserted_fact.id
+                    f"Successfully processed raw data and saved structured facts for {raw_record.url}. Fact ID: {inserted_fact_id}")
+                return inserted_fact_id
             else:
-                logger.error(f"Failed to save structured fact for {raw_record.url} to DB.")
+                logger.info(f"No new structured fact saved for {raw_record.url} (duplicate or DB error).")
                 return None
 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"LLM output was not valid JSON for {raw_record.url}: {e} -> {extracted_json_str[:500]}")
             raw_record.status = "FAILED_JSON"
-            db_manager.update_record(raw_record)
+            get_db_manager().update_record(raw_record)
             return None
         except Exception as e:
             logger.error(f"Error during structured data processing for {raw_record.url}: {e}")
             raw_record.status = "FAILED_PARSING"
-            db_manager.update_record(raw_record)
+            get_db_manager().update_record(raw_record)
             return None
 
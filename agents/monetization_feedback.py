@@ -1,21 +1,43 @@
 # agents/monetization_feedback.py
-import json
+import orjson  # Fast C JSON parsing/serialization
+import re
+import itertools
+import zlib
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from config.settings import (
     ADSENSE_PUBLISHER_ID, ADSENSE_AD_SLOT_ID, AMAZON_ASSOCIATES_TAG,
-    NICHE_TOPIC, RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET
+    NICHE_TOPIC, RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET, LLM_BATCH_MAX_CONCURRENCY, LLM_PROMPT_DATA_MAX_TOKENS
 )
-from database.db_manager import DBManager
+from database.db_manager import get_db_manager
 from database.models import GeneratedContent, PublishedContent, PerformanceMetric
 from utils.logger import setup_logger
-from utils.llm_interface import LLMInterface
-from utils.prompt_templates import AFFILIATE_LINK_OPPORTUNITY_PROMPT, PERFORMANCE_ANALYSIS_PROMPT
+from utils.llm_interface import get_llm_interface, truncate_to_tokens
+from utils.cache import LLMCache
+from utils.http_session import create_session, API_RETRY_POLICY
+from utils.rate_limiter import razorpay_limiter
+from utils.prompt_templates import AFFILIATE_LINK_OPPORTUNITY_PROMPT_FN, PERFORMANCE_ANALYSIS_PROMPT_FN
 import random
 
 logger = setup_logger("MonetizationFeedbackAgent")
-db_manager = DBManager()
-llm_interface = LLMInterface()
+llm_interface = get_llm_interface()
+llm_cache = LLMCache()
+
+_P_CLOSE = re.compile(r'</p>')
+
+# In-article AdSense unit, built once at import from the configured publisher and slot IDs ("" if unconfigured)
+_AD_CODE_UNIT = f"""
+            <div class="ad-unit" style="margin: 20px auto; text-align: center;">
+                <script async src="https://pagead2.googlesyndication.com/pagead/js/adsbygoogle.js?client=ca-pub-{ADSENSE_PUBLISHER_ID}" crossorigin="anonymous"></script>
+                <ins class="adsbygoogle"
+                     style="display:block; text-align:center;"
+                     data-ad-layout="in-article"
+                     data-ad-format="fluid"
+                     data-ad-slot="{ADSENSE_AD_SLOT_ID}"></ins>
+                <script>(adsbygoogle = window.adsbygoogle || []).push({{}});</script>
+            </div>
+            """ if ADSENSE_PUBLISHER_ID and ADSENSE_AD_SLOT_ID else ""
 
 
 class MonetizationFeedbackAgent:
@@ -24,15 +46,24 @@ class MonetizationFeedbackAgent:
     and analyzing performance metrics to provide optimization feedback.
     """
 
+    def __init__(self):
+        # Shared keep-alive session, so repeated Razorpay calls reuse TLS connections
+        self._session = create_session(pool_maxsize=20, max_retries=API_RETRY_POLICY)
+
     def inject_monetization(self, generated_content_id: int) -> str | None:
         """
         Injects AdSense code and Amazon India affiliate links into the content's HTML.
         Returns the monetized HTML, or None on failure.
         """
-        content = db_manager.get_record_by_id(GeneratedContent, generated_content_id)
+        content = get_db_manager().get_record_by_id(GeneratedContent, generated_content_id)
         if not content:
             logger.error(f"Content {generated_content_id} not found for monetization injection.")
             return None
+        return self._inject_for_content(content)
+
+    def _inject_for_content(self, content: GeneratedContent) -> str | None:
+        """`inject_monetization` for an already loaded GeneratedContent record."""
+        generated_content_id = content.id
         if content.status == "MONETIZED" or content.status == "PUBLISHED":
             logger.info(f"Content {generated_content_id} already monetized. Skipping.")
             return content.body_html
@@ -42,55 +73,67 @@ class MonetizationFeedbackAgent:
         monetized_html = content.body_html
 
         # 1. AdSense Injection (simple heuristic for example)
-        if ADSENSE_PUBLISHER_ID and ADSENSE_AD_SLOT_ID:
-            ad_code_unit = f"""
-            <div class="ad-unit" style="margin: 20px auto; text-align: center;">
-                <script async src="https://pagead2.googlesyndication.com/pagead/js/adsbygoogle.js?client=ca-pub-{ADSENSE_PUBLISHER_ID}" crossorigin="anonymous"></script>
-                <ins class="adsbygoogle"
-                     style="display:block; text-align:center;"
-                     data-ad-layout="in-article"
-                     data-ad-format="fluid"
-                     data-ad-slot="{ADSENSE_AD_SLOT_ID}"></ins>
-                <script>(adsbygoogle = window.adsbygoogle || []).push({});</script>
-            </div>
-            """
-
-            # Inject ad unit after every 3rd paragraph
-            paragraphs = monetized_html.split('</p>')
-            new_paragraphs = []
-            for i, p in enumerate(paragraphs):
-                new_paragraphs.append(p)
-                if (i + 1) % 3 == 0 and i < len(paragraphs) - 1:  # Inject every 3rd paragraph
-                    new_paragraphs.append(ad_code_unit)
-            monetized_html = '</p>'.join(new_paragraphs)
-            logger.info(f"AdSense code injected into content {generated_content_id}.")
-        else:
+        if not _AD_CODE_UNIT:
             logger.warning("AdSense credentials not fully configured. Skipping AdSense injection.")
+        elif monetized_html.count('</p>') < 3:  # Too short for an in-article ad; skip the substitution pass
+            logger.info(f"Content {generated_content_id} has fewer than 3 paragraphs. Skipping AdSense injection.")
+        else:
+            # Inject ad unit after every 3rd paragraph (not after the final one), in a single substitution pass
+            paragraph_counter = itertools.count(1)
+            html_length = len(monetized_html)
+
+            def _insert_ad_after_paragraph(match: re.Match) -> str:
+                if next(paragraph_counter) % 3 == 0 and match.end() < html_length:
+                    return '</p>' + _AD_CODE_UNIT
+                return '</p>'
+
+            monetized_html = _P_CLOSE.sub(_insert_ad_after_paragraph, monetized_html)
+            logger.info(f"AdSense code injected into content {generated_content_id}.")
 
         # 2. Affiliate Link Injection (Amazon India)
         if AMAZON_ASSOCIATES_TAG:
-            prompt = AFFILIATE_LINK_OPPORTUNITY_PROMPT.format(
+            article_text = content.body_html[:5000]  # Limit input to LLM token window (sliced once, reused for the cache key)
+            prompt = AFFILIATE_LINK_OPPORTUNITY_PROMPT_FN(
                 language_name=content.language,
-                article_text=content.body_html[:5000]  # Limit input to LLM token window
+                article_text=article_text
             )
-            affiliate_suggestions_json = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=500,
-                                                                     temperature=0.5)
+            # Cached: retries and re-runs on unchanged content skip the LLM round-trip
+            cache_key = LLMCache.make_key("affiliate_links", "gemini", content.language, article_text)
+            affiliate_suggestions_json = llm_cache.generate_text(llm_interface, cache_key, prompt,
+                                                                 model_choice="gemini", max_tokens=500,
+                                                                 temperature=0.5)
 
             try:
-                affiliate_suggestions = json.loads(affiliate_suggestions_json).get("affiliate_links", [])
+                affiliate_suggestions = orjson.loads(affiliate_suggestions_json).get("affiliate_links", [])
+                if not affiliate_suggestions:
+                    logger.info(f"No affiliate link opportunities suggested for {generated_content_id}.")
+                affiliate_links = {}  # keyword -> affiliate link (first suggestion for a keyword wins)
                 for link_data in affiliate_suggestions:
                     keyword = link_data.get('keyword')
                     amazon_search_term = link_data.get('amazon_search_term', keyword)
-                    if keyword and amazon_search_term:
+                    if keyword and amazon_search_term and keyword not in affiliate_links:
                         # Dynamically generate Amazon affiliate search link
-                        affiliate_link = f"https://www.amazon.in/s?k={amazon_search_term.replace(' ', '+')}&tag={AMAZON_ASSOCIATES_TAG}"
-                        # Replace only first occurrence of keyword to avoid over-linking
-                        monetized_html = monetized_html.replace(keyword,
-                                                                f'<a href="{affiliate_link}" target="_blank" rel="sponsored noopener noreferrer">{keyword}</a>',
-                                                                1)
+                        affiliate_links[keyword] = f"https://www.amazon.in/s?k={amazon_search_term.replace(' ', '+')}&tag={AMAZON_ASSOCIATES_TAG}"
+
+                if affiliate_links:
+                    # One pass over the HTML for all keywords (longest first, so overlapping keywords prefer
+                    # the most specific one). Inserted anchors are never rescanned.
+                    keyword_pattern = re.compile(
+                        "|".join(re.escape(keyword) for keyword in sorted(affiliate_links, key=len, reverse=True)))
+                    linked_keywords = set()
+
+                    def _link_first_occurrence(match: re.Match) -> str:
+                        keyword = match.group(0)
+                        if keyword in linked_keywords:  # Link only first occurrence of keyword to avoid over-linking
+                            return keyword
+                        linked_keywords.add(keyword)
+                        return f'<a href="{affiliate_links[keyword]}" target="_blank" rel="sponsored noopener noreferrer">{keyword}</a>'
+
+                    monetized_html = keyword_pattern.sub(_link_first_occurrence, monetized_html)
+                    for keyword in linked_keywords:
                         logger.info(f"Injected affiliate link for '{keyword}'.")
 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 logger.warning(
                     f"Failed to parse affiliate suggestions JSON for {generated_content_id}: {e} -> {affiliate_suggestions_json[:500]}")
             except Exception as e:
@@ -101,10 +144,31 @@ class MonetizationFeedbackAgent:
         # Update the content in the database with the monetized HTML
         content.body_html = monetized_html
         content.status = "MONETIZED"
-        db_manager.update_record(content)
+        get_db_manager().update_record(content)
         logger.info(f"Monetization injected for content ID: {generated_content_id}.")
         return monetized_html
 
+    def inject_monetization_batch(self, generated_content_ids: list[int]) -> list[str | None]:
+        """
+        Injects monetization into several content items concurrently.
+        Each item's affiliate prompt is built from its own article, so the LLM calls can't be marshalled
+        into one prompt; they are fanned out instead (throttled by the shared LLM rate limiter).
+        Returns the monetized HTML in input order, with None for failures.
+        """
+        contents = get_db_manager().get_records_by_ids(GeneratedContent, generated_content_ids)  # One SELECT for all
+
+        def _inject(generated_content_id: int) -> str | None:
+            content = contents.get(generated_content_id)
+            if not content:
+                logger.error(f"Content {generated_content_id} not found for monetization injection.")
+                return None
+            return self._inject_for_content(content)
+
+        if len(generated_content_ids) <= 1:
+            return [_inject(content_id) for content_id in generated_content_ids]
+        with ThreadPoolExecutor(max_workers=min(len(generated_content_ids), LLM_BATCH_MAX_CONCURRENCY)) as executor:
+            return list(executor.map(_inject, generated_content_ids))
+
     def sell_digital_product(self, generated_content_id: int, product_name: str, amount_in_paise: int) -> str | None:
         """
         Creates a Razorpay payment link for a digital product related to the content.
@@ -114,7 +178,7 @@ class MonetizationFeedbackAgent:
             logger.warning("Razorpay credentials not configured. Skipping digital product sales.")
             return None
 
-        content = db_manager.get_record_by_id(GeneratedContent, generated_content_id)
+        content = get_db_manager().get_record_by_id(GeneratedContent, generated_content_id)
         if not content:
             logger.error(f"Content {generated_content_id} not found for digital product sale.")
             return None
@@ -132,7 +196,8 @@ class MonetizationFeedbackAgent:
         }
 
         try:
-            response = requests.post(order_url, auth=auth, json=order_payload, timeout=30)
+            razorpay_limiter.acquire()
+            response = self._session.post(order_url, auth=auth, json=order_payload, timeout=30)
             response.raise_for_status()
             order_data = response.json()
             order_id = order_data.get('id')
@@ -208,30 +273,28 @@ class MonetizationFeedbackAgent:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=1)  # Collect for last 24 hours
 
-        published_items = db_manager.get_published_content_for_metrics()
+        published_items = get_db_manager().get_published_content_for_metrics()
+        collected_at = datetime.utcnow()
+        metric_rows = []
         for item in published_items:
             # Generate dummy data for views, clicks, revenue based on content ID
             # In a real system, these would come from actual analytics APIs
-            views = abs(hash(item.external_url) % 5000) + 100  # Min 100 views
+            # crc32 is stable across processes (unlike the PYTHONHASHSEED-salted hash()) and fast C code
+            views = zlib.crc32(item.external_url.encode('utf-8')) % 5000 + 100  # Min 100 views
             revenue_usd = (views / 1000) * random.uniform(0.5, 2.0)  # Example RPM $0.5 to $2.0 per 1000 views
 
-            # Store views
-            db_manager.insert_record(PerformanceMetric(
-                published_content_id=item.id,
-                metric_type="VIEWS",
-                value=float(views),
-                timestamp=datetime.utcnow()
-            ))
-            # Store revenue
-            db_manager.insert_record(PerformanceMetric(
-                published_content_id=item.id,
-                metric_type="REVENUE_USD",
-                value=float(revenue_usd),
-                timestamp=datetime.utcnow()
-            ))
+            # Views and revenue rows are stored together in one bulk insert after the loop
+            metric_rows.append({"published_content_id": item.id, "metric_type": "VIEWS", "value": float(views),
+                                "timestamp": collected_at})
+            metric_rows.append({"published_content_id": item.id, "metric_type": "REVENUE_USD",
+                                "value": float(revenue_usd), "timestamp": collected_at})
             logger.debug(
                 f"Collected simulated metrics for {item.external_url}: Views={views}, Revenue=${revenue_usd:.2f}")
 
+        if not get_db_manager().bulk_insert_mappings(PerformanceMetric, metric_rows):
+            logger.error(f"Failed to store {len(metric_rows)} performance metrics.")
+            return
+
         logger.info("Performance metrics collection complete.")
 
     def analyze_and_optimize(self):
@@ -241,39 +304,33 @@ class MonetizationFeedbackAgent:
         """
         logger.info("Analyzing performance and generating optimization directives.")
 
-        # Fetch recent performance data (e.g., last 7 days)
+        # Fetch recent performance averages (e.g., last 7 days), aggregated per content ID and metric type in SQL
         seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        session = db_manager.get_session()
-        try:
-            recent_metrics = session.query(PerformanceMetric).filter(
-                PerformanceMetric.timestamp >= seven_days_ago).all()
-        finally:
-            session.close()
+        metric_averages = get_db_manager().get_metric_averages_since(seven_days_ago)
 
-        # Aggregate metrics by content ID
+        # Pivot to {content_id: {"AVG_VIEWS": ..., "AVG_REVENUE_USD": ..., "AVG_<METRIC>": ...}} for the analysis
         content_performance_data = {}
-        for metric in recent_metrics:
-            if metric.published_content_id not in content_performance_data:
-                content_performance_data[metric.published_content_id] = {"VIEWS": [], "REVENUE_USD": []}
-            content_performance_data[metric.published_content_id][metric.metric_type].append(metric.value)
-
-        # Calculate averages for analysis
-        for content_id, metrics in content_performance_data.items():
-            metrics["AVG_VIEWS"] = sum(metrics["VIEWS"]) / len(metrics["VIEWS"]) if metrics["VIEWS"] else 0
-            metrics["AVG_REVENUE_USD"] = sum(metrics["REVENUE_USD"]) / len(metrics["REVENUE_USD"]) if metrics[
-                "REVENUE_USD"] else 0
+        for content_id, metric_type, average in metric_averages:
+            metrics = content_performance_data.setdefault(content_id, {"AVG_VIEWS": 0, "AVG_REVENUE_USD": 0})
+            metrics[f"AVG_{metric_type}"] = float(average)
             # Add more aggregated metrics (e.g., CTR, conversion rate if available)
 
+        if not content_performance_data:
+            logger.info("No performance metrics in the last 7 days. Skipping optimization analysis.")
+            return
+
         # Use LLM to analyze and suggest directives
-        prompt = PERFORMANCE_ANALYSIS_PROMPT.format(
-            performance_data_json=json.dumps(content_performance_data, indent=2)
+        performance_data_json = orjson.dumps(content_performance_data,
+                                             option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+        prompt = PERFORMANCE_ANALYSIS_PROMPT_FN(
+            performance_data_json=truncate_to_tokens(performance_data_json, LLM_PROMPT_DATA_MAX_TOKENS)
         )
 
         directives_json_str = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=1000,
                                                           temperature=0.6)
 
         try:
-            directives = json.loads(directives_json_str).get("directives", [])
+            directives = orjson.loads(directives_json_str).get("directives", [])
             if not isinstance(directives, list): raise ValueError("Expected list of directives.")
 
             for directive in directives:
@@ -286,7 +343,7 @@ class MonetizationFeedbackAgent:
                 #     if directive['action'] == 'generate_more':
                 #         # orchestrator.trigger_content_generation(topic=directive['topic_focus'], quantity=directive['quantity'])
                 pass  # Placeholder for actual directive processing
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse optimization directives JSON: {e} -> {directives_json_str[:500]}")
         except ValueError as e:
             logger.error(f"Optimization directives validation failed: {e}")
@@ -1,8 +1,11 @@
 # agents/seo_distribution.py
 import requests
 import base64
-import json
+import hashlib
+import orjson  # Fast C JSON parsing/serialization
 import os
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 # For YouTube API, you'd need google-api-python-client and google-auth-oauthlib
 # from google.oauth2.credentials import Credentials
 # from google_auth_oauthlib.flow import InstalledAppFlow
@@ -13,17 +16,23 @@ import os
 
 from config.settings import (
     WORDPRESS_API_URL, WORDPRESS_USERNAME, WORDPRESS_APP_PASSWORD,
-    YOUTUBE_API_KEY, NICHE_TOPIC, DATA_DIR
+    YOUTUBE_API_KEY, NICHE_TOPIC, DATA_DIR, PUBLISH_MAX_CONCURRENCY, SEO_BATCH_SIZE, LLM_BATCH_MAX_CONCURRENCY
 )
-from database.db_manager import DBManager
+from database.db_manager import get_db_manager
 from database.models import GeneratedContent, PublishedContent
 from utils.logger import setup_logger
-from utils.llm_interface import LLMInterface
-from utils.prompt_templates import SEO_OPTIMIZATION_PROMPT
+from utils.llm_interface import get_llm_interface
+from utils.cache import LLMCache
+from utils.http_session import create_session, API_RETRY_POLICY
+from utils.rate_limiter import wordpress_limiter
+from utils.prompt_templates import SEO_OPTIMIZATION_PROMPT, SEO_OPTIMIZATION_BATCH_PROMPT, make_formatter
 
 logger = setup_logger("SEODistributionAgent")
-db_manager = DBManager()
-llm_interface = LLMInterface()
+llm_interface = get_llm_interface()
+llm_cache = LLMCache()
+# Prompt renderers with the niche topic bound once (see make_formatter)
+_seo_optimization_prompt = make_formatter(SEO_OPTIMIZATION_PROMPT, niche_topic=NICHE_TOPIC)
+_seo_optimization_batch_prompt = make_formatter(SEO_OPTIMIZATION_BATCH_PROMPT, niche_topic=NICHE_TOPIC)
 
 
 class SEODistributionAgent:
@@ -31,41 +40,43 @@ class SEODistributionAgent:
     Agent responsible for optimizing content for SEO and publishing it to various platforms.
     """
 
+    def __init__(self):
+        # Shared keep-alive session, so repeated posts and media uploads reuse TLS connections
+        self._session = create_session(pool_maxsize=20, max_retries=API_RETRY_POLICY)
+        credentials = f"{WORDPRESS_USERNAME}:{WORDPRESS_APP_PASSWORD}"
+        token = base64.b64encode(credentials.encode()).decode('utf-8')
+        self._wp_auth_header = {'Authorization': f'Basic {token}'}
+
     def optimize_content_seo(self, generated_content_id: int) -> dict | None:
         """
         Uses LLM to generate SEO meta data and internal linking suggestions for content.
         Updates the GeneratedContent record with this data.
         """
-        content = db_manager.get_record_by_id(GeneratedContent, generated_content_id)
+        content = get_db_manager().get_record_by_id(GeneratedContent, generated_content_id)
         if not content:
             logger.error(f"Content {generated_content_id} not found for SEO optimization.")
             return None
+        return self._optimize_seo_for_content(content)
 
+    def _optimize_seo_for_content(self, content: GeneratedContent) -> dict | None:
+        """`optimize_content_seo` for an already loaded GeneratedContent record."""
+        generated_content_id = content.id
         logger.info(f"Optimizing SEO for content ID: {generated_content_id}")
 
-        prompt = SEO_OPTIMIZATION_PROMPT.format(
-            article_title=content.title,
-            niche_topic=NICHE_TOPIC,
-            article_text=content.body_html[:5000]  # Limit input to LLM token window
-        )
+        article_text = content.body_html[:5000]  # Limit input to LLM token window
+        prompt = _seo_optimization_prompt(article_title=content.title, article_text=article_text)
 
-        seo_suggestions_json = llm_interface.generate_text(prompt, model_choice="gemini", max_tokens=500,
-                                                           temperature=0.3)
+        # Cached: retries and re-runs on unchanged content skip the LLM round-trip
+        cache_key = LLMCache.make_key("seo_optimization", "gemini", content.title, NICHE_TOPIC, article_text)
+        seo_suggestions_json = llm_cache.generate_text(llm_interface, cache_key, prompt, model_choice="gemini",
+                                                       max_tokens=500, temperature=0.3)
         if not seo_suggestions_json:
             logger.error(f"Failed to get SEO suggestions for {generated_content_id}.")
             return None
 
         try:
-            seo_data = json.loads(seo_suggestions_json)
-            # Validate basic structure
-            if not all(k in seo_data for k in ["meta_title", "meta_description", "internal_links"]):
-                raise ValueError("Invalid SEO suggestions JSON structure.")
-
-            content.meta_data = seo_data  # Store SEO data in the 'meta_data' JSON column
-            db_manager.update_record(content)
-            logger.info(f"SEO optimized for {generated_content_id}. Meta Title: {seo_data.get('meta_title')}")
-            return seo_data
-        except json.JSONDecodeError as e:
+            return self._apply_seo_data(content, orjson.loads(seo_suggestions_json))
+        except orjson.JSONDecodeError as e:
             logger.error(
                 f"Failed to parse SEO suggestions JSON for {generated_content_id}: {e} -> {seo_suggestions_json[:500]}")
             return None
@@ -73,15 +84,90 @@ class SEODistributionAgent:
             logger.error(f"SEO suggestions validation failed for {generated_content_id}: {e}")
             return None
 
+    def optimize_seo_batch(self, generated_content_ids: list[int]) -> list[dict | None]:
+        """
+        Batched variant of `optimize_content_seo`: up to SEO_BATCH_SIZE articles are marshalled into a single
+        LLM prompt, so N articles cost about N / SEO_BATCH_SIZE LLM round-trips.
+        Articles missing from (or invalid in) a batch response fall back to the single-article call.
+        Returns the SEO data in input order, with None for failures.
+        """
+        results = [None] * len(generated_content_ids)
+        pending = []  # (input index, content)
+        contents = get_db_manager().get_records_by_ids(GeneratedContent, generated_content_ids)  # One SELECT for all
+        for i, generated_content_id in enumerate(generated_content_ids):
+            content = contents.get(generated_content_id)
+            if not content:
+                logger.error(f"Content {generated_content_id} not found for SEO optimization.")
+                continue
+            pending.append((i, content))
+
+        for batch_start in range(0, len(pending), SEO_BATCH_SIZE):
+            batch = pending[batch_start:batch_start + SEO_BATCH_SIZE]
+            if len(batch) == 1:
+                i, content = batch[0]
+                results[i] = self._optimize_seo_for_content(content)
+                continue
+
+            logger.info(f"Optimizing SEO for a batch of {len(batch)} content items.")
+            articles_json = orjson.dumps(
+                [{"id": content.id, "title": content.title, "text": content.body_html[:2000]} for _, content in batch]
+            ).decode()
+            prompt = _seo_optimization_batch_prompt(articles_json=articles_json)
+            seo_suggestions_json = llm_interface.generate_text(prompt, model_choice="gemini",
+                                                               max_tokens=500 * len(batch), temperature=0.3)
+            try:
+                seo_data_by_id = orjson.loads(seo_suggestions_json) if seo_suggestions_json else {}
+                if not isinstance(seo_data_by_id, dict):
+                    raise ValueError("Expected a JSON object keyed by article id.")
+            except (orjson.JSONDecodeError, ValueError) as e:
+                logger.error(f"Failed to parse batched SEO suggestions: {e}. Falling back to per-article calls.")
+                seo_data_by_id = {}
+
+            retries = []  # (input index, content)
+            for i, content in batch:
+                try:
+                    results[i] = self._apply_seo_data(content, seo_data_by_id[str(content.id)])
+                except (KeyError, ValueError):
+                    logger.warning(f"No valid batched SEO suggestions for {content.id}. Retrying individually.")
+                    retries.append((i, content))
+
+            # Individual retries use different prompts, so they are fanned out concurrently instead
+            if retries:
+                with ThreadPoolExecutor(max_workers=min(len(retries), LLM_BATCH_MAX_CONCURRENCY)) as executor:
+                    retried = executor.map(self._optimize_seo_for_content, [content for _, content in retries])
+                    for (i, _), seo_data in zip(retries, retried):
+                        results[i] = seo_data
+        return results
+
+    def _apply_seo_data(self, content: GeneratedContent, seo_data) -> dict:
+        """
+        Validates LLM SEO suggestions and stores them on the content record.
+        Raises ValueError if the suggestions don't have the expected structure.
+        """
+        # Validate basic structure
+        if not isinstance(seo_data, dict) or not all(
+                k in seo_data for k in ["meta_title", "meta_description", "internal_links"]):
+            raise ValueError("Invalid SEO suggestions JSON structure.")
+
+        content.meta_data = seo_data  # Store SEO data in the 'meta_data' JSON column
+        get_db_manager().update_record(content)
+        logger.info(f"SEO optimized for {content.id}. Meta Title: {seo_data.get('meta_title')}")
+        return seo_data
+
     def publish_to_wordpress(self, generated_content_id: int) -> str | None:
         """
         Publishes content to a headless WordPress instance via its REST API.
         Returns the published URL or None on failure.
         """
-        content = db_manager.get_record_by_id(GeneratedContent, generated_content_id)
+        content = get_db_manager().get_record_by_id(GeneratedContent, generated_content_id)
         if not content:
             logger.error(f"Content {generated_content_id} not found for WordPress publishing.")
             return None
+        return self._publish_content_to_wordpress(content)
+
+    def _publish_content_to_wordpress(self, content: GeneratedContent) -> str | None:
+        """`publish_to_wordpress` for an already loaded GeneratedContent record."""
+        generated_content_id = content.id
         if content.status == "PUBLISHED":
             logger.info(f"Content {generated_content_id} already published. Skipping.")
             return None  # Or return existing URL
@@ -89,15 +175,12 @@ class SEODistributionAgent:
         logger.info(f"Publishing content ID: {generated_content_id} to WordPress.")
 
         wp_api_url = f"{WORDPRESS_API_URL}/wp/v2/posts"
-        credentials = f"{WORDPRESS_USERNAME}:{WORDPRESS_APP_PASSWORD}"
-        token = base64.b64encode(credentials.encode()).decode('utf-8')
-        headers = {'Authorization': f'Basic {token}'}
 
         featured_media_id = None
         if content.associated_images:
             try:
                 # Upload the first associated image as featured image
-                featured_media_id = self._upload_image_to_wp_media(content.associated_images[0], headers)
+                featured_media_id = self._upload_image_to_wp_media(content.associated_images[0])
             except Exception as e:
                 logger.error(f"Failed to upload featured image for {generated_content_id}: {e}")
                 # Continue publishing without featured image if upload fails
@@ -127,7 +210,8 @@ class SEODistributionAgent:
         }
 
         try:
-            response = requests.post(wp_api_url, headers=headers, json=post_data, timeout=60)
+            wordpress_limiter.acquire()
+            response = self._session.post(wp_api_url, headers=self._wp_auth_header, json=post_data, timeout=60)
             response.raise_for_status()
             published_data = response.json()
             external_url = published_data.get('link')
@@ -137,9 +221,10 @@ class SEODistributionAgent:
                 platform="WORDPRESS",
                 external_url=external_url
             )
-            db_manager.insert_record(published_record)
             content.status = "PUBLISHED"
-            db_manager.update_record(content)
+            # Record the publication and the status change in one transaction
+            if not get_db_manager().commit_batch([published_record, content]):
+                logger.error(f"Content {generated_content_id} was published to {external_url} but could not be recorded.")
             logger.info(f"Successfully published content {generated_content_id} to WordPress: {external_url}")
             return external_url
 
@@ -147,29 +232,51 @@ class SEODistributionAgent:
             logger.error(
                 f"WordPress publishing failed for {generated_content_id}: {e} - Response: {getattr(e, 'response', 'No response').text}")
             content.status = "ERROR_PUBLISH"
-            db_manager.update_record(content)
+            get_db_manager().update_record(content)
             return None
         except Exception as e:
             logger.error(f"Unexpected error during WordPress publishing for {generated_content_id}: {e}")
             content.status = "ERROR_PUBLISH"
-            db_manager.update_record(content)
+            get_db_manager().update_record(content)
             return None
 
-    def _upload_image_to_wp_media(self, image_path: str, headers: dict) -> int | None:
+    def publish_batch(self, generated_content_ids: list[int]) -> list[str | None]:
+        """
+        Publishes several content items to WordPress concurrently over the shared session.
+        Each item's media upload and post creation stay sequential (the post needs the media ID),
+        but items overlap, so a batch takes about as long as its slowest item.
+        Returns the published URLs in input order, with None for failures.
+        """
+        contents = get_db_manager().get_records_by_ids(GeneratedContent, generated_content_ids)  # One SELECT for all
+
+        def _publish(generated_content_id: int) -> str | None:
+            content = contents.get(generated_content_id)
+            if not content:
+                logger.error(f"Content {generated_content_id} not found for WordPress publishing.")
+                return None
+            return self._publish_content_to_wordpress(content)
+
+        if len(generated_content_ids) <= 1:
+            return [_publish(content_id) for content_id in generated_content_ids]
+        with ThreadPoolExecutor(max_workers=min(len(generated_content_ids), PUBLISH_MAX_CONCURRENCY)) as executor:
+            return list(executor.map(_publish, generated_content_ids))
+
+    def _upload_image_to_wp_media(self, image_path: str) -> int | None:
         """
         Helper function to upload an image file to WordPress Media Library.
         Returns the media ID on success.
         """
         media_api_url = f"{WORDPRESS_API_URL}/wp/v2/media"
-        headers_media = headers.copy()
+        headers_media = self._wp_auth_header.copy()
         headers_media['Content-Disposition'] = f'attachment; filename="{os.path.basename(image_path)}"'
-        # Determine content type dynamically or assume PNG
-        headers_media['Content-Type'] = 'image/png'
+        # Determine content type from the file name, defaulting to PNG (Stability AI output)
+        headers_media['Content-Type'] = mimetypes.guess_type(image_path)[0] or 'image/png'
 
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
-            response = requests.post(media_api_url, headers=headers_media, data=image_data, timeout=30)
+            headers_media['Content-Length'] = str(os.path.getsize(image_path))
+            wordpress_limiter.acquire()
+            with open(image_path, 'rb') as f:  # Streamed from the file object, never fully read into memory
+                response = self._session.post(media_api_url, headers=headers_media, data=f, timeout=30)
             response.raise_for_status()
             logger.info(f"Image {os.path.basename(image_path)} uploaded to WP media. ID: {response.json()['id']}")
             return response.json()['id']
@@ -186,14 +293,15 @@ class SEODistributionAgent:
         Publishes video content to YouTube. This requires Google OAuth 2.0 setup.
         This is a highly simplified placeholder. Full implementation is complex.
         """
-        content = db_manager.get_record_by_id(GeneratedContent, generated_content_id)
+        content = get_db_manager().get_record_by_id(GeneratedContent, generated_content_id)
         if not content or not content.associated_video_path or not os.path.exists(content.associated_video_path):
             logger.error(
                 f"Video content {generated_content_id} not found or video file missing for YouTube publishing.")
             return None
         if content.status == "PUBLISHED":  # Check if already published
-            published_record = db_manager.query_records(PublishedContent, generated_content_id=generated_content_id,
-                                                        platform="YOUTUBE")
+            published_record = get_db_manager().query_records(PublishedContent,
+                                                              generated_content_id=generated_content_id,
+                                                              platform="YOUTUBE")
             if published_record:
                 logger.info(
                     f"Video content {generated_content_id} already published to YouTube: {published_record[0].external_url}. Skipping.")
@@ -246,16 +354,16 @@ class SEODistributionAgent:
                 platform="YOUTUBE",
                 external_url=youtube_url
             )
-            db_manager.insert_record(published_record)
+            get_db_manager().insert_record(published_record)
             content.status = "PUBLISHED"  # Mark as published after all platforms are done, or manage per platform
-            db_manager.update_record(content)
+            get_db_manager().update_record(content)
             logger.info(f"Successfully published video {generated_content_id} to YouTube: {youtube_url}")
             return youtube_url
 
         except Exception as e:  # Catch HttpError for API specific errors in real implementation
             logger.error(f"YouTube publishing failed for {generated_content_id}: {e}")
             content.status = "ERROR_PUBLISH"
-            db_manager.update_record(content)
+            get_db_manager().update_record(content)
             return None
 
     # Implement similar methods for Twitter, Reddit, Pinterest publishing.
@@ -13,6 +13,7 @@ NICHE_TOPIC = "Solar Pump Systems for Rajasthan Farmers"
 # 'mr' (Marwari) is generally covered by 'hi' (Hindi) models or requires specific fine-tuning/data.
 TARGET_LANGUAGES = ["en", "hi"]
 CONTENT_VOLUME_PER_DAY = 20 # Target number of articles/guides per day initially
+WORK_CLAIM_TIMEOUT_MINUTES = 120 # Queue rows claimed by a worker that crashed become claimable again after this
 
 # --- API Keys & Credentials ---
 # IMPORTANT: Replace these with your actual API keys in the .env file.
@@ -27,6 +28,9 @@ BRIGHT_DATA_API_KEY = os.getenv("BRIGHT_DATA_API_KEY")
 BRIGHT_DATA_ZONE = os.getenv("BRIGHT_DATA_ZONE", "residential") # e.g., residential, datacenter
 BRIGHT_DATA_HOST = os.getenv("BRIGHT_DATA_HOST", "brd.superproxy.io")
 BRIGHT_DATA_PORT = os.getenv("BRIGHT_DATA_PORT", "22225")
+MAX_HTML_BYTES = 512 * 1024 # Scraped pages are truncated to this many bytes before storage
+RAW_HTML_ZSTD_LEVEL = 3 # zstd level for stored raw HTML (typically 6-10x smaller at ~500 MB/s)
+SCRAPE_MAX_CONCURRENCY = 8 # Max parallel page fetches per scrape batch
 
 # CMS (WordPress)
 WORDPRESS_API_URL = os.getenv("WORDPRESS_API_URL") # e.g., "https://yourdomain.com/wp-json"
@@ -47,21 +51,73 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_NAME = os.getenv("DB_NAME")
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Connection pool, per worker process. A prefork process runs one task at a time, so size it for the threads
+# a task fans out to. Peak connections = sum of worker concurrency (-c, see docker-compose.yml)
+# x (DB_POOL_SIZE + DB_MAX_OVERFLOW), which must stay below Postgres max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30")) # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # Seconds before a connection is replaced
 
 # --- Content Generation Settings ---
 MIN_ARTICLE_LENGTH_WORDS = 800
 MAX_ARTICLE_LENGTH_WORDS = 2000
+ARTICLE_LLM_COVERAGE_CHECK_ENABLED = False # Extra (cached) LLM call checking articles cover their structured data
+# Near-duplicate detection: articles are split into content-defined chunks of lines (a boundary after
+# ~1 in CONTENT_CHUNK_BOUNDARY_MODULUS lines). An article is a duplicate if at least
+# CONTENT_DEDUP_CHUNK_THRESHOLD of its chunks already appear in a single existing article.
+CONTENT_CHUNK_BOUNDARY_MODULUS = 8
+CONTENT_DEDUP_CHUNK_THRESHOLD = 0.8
+# Skip generating an article when existing content in the same language was generated from a fact whose
+# embedding is within this cosine distance (similarity >= 0.92); checked before the LLM call
+ARTICLE_SEMANTIC_DEDUP_MAX_COSINE_DISTANCE = 0.08
 TEXT_GENERATION_MODEL = "gemini-pro" # Default LLM for text
+LLM_BATCH_SIZE = 16 # Number of prompts flushed together by the batch pipelines
+LLM_BATCH_MAX_CONCURRENCY = 8 # Max in-flight LLM requests per batch
+LLM_MAX_ATTEMPTS = 5 # Attempts per LLM/embedding API call on transient errors (429, timeouts, 5xx)
+# A provider failing this many calls in a row (after retries) is skipped for LLM_CIRCUIT_RESET_SECONDS;
+# text generation then fails over to the other provider if enabled and configured
+LLM_CIRCUIT_FAIL_MAX = 5
+LLM_CIRCUIT_RESET_SECONDS = 60
+LLM_FAILOVER_ENABLED = True
+# LLM time budget of one batched article generation task; articles not generated by then are left for the next run.
+# Keep well below WORK_CLAIM_TIMEOUT_MINUTES so claimed facts are released before they can be claimed twice.
+CONTENT_GENERATION_LLM_DEADLINE_SECONDS = 30 * 60
+# Context windows (prompt + output tokens) of the text models; oversized requests are trimmed or skipped before sending
+LLM_CONTEXT_WINDOW_TOKENS = {"gemini": 30720, "openai": 128000}
+LLM_PROMPT_DATA_MAX_TOKENS = 8000 # Cap on one unbounded data block (structured data, metrics JSON) within a prompt
+# Per-provider overrides for LLMInterface.generate_batch (providers not listed use LLM_BATCH_MAX_CONCURRENCY)
+LLM_BATCH_MAX_CONCURRENCY_BY_PROVIDER = {"gemini": 8, "openai": 10}
+EMBEDDING_CACHE_MAX_ENTRIES = 10000 # In-process LRU size for embedding results
+EMBEDDING_CACHE_STATS_LOG_INTERVAL = 500 # Log embedding cache hit/miss counts (debug) every N lookups
+EMBEDDING_DIM = 768 # Dimension of models/text-embedding-004 vectors (pgvector column size)
+# Max inputs per embedding API request (provider limits for batched embedding calls)
+EMBEDDING_BATCH_MAX_INPUTS = {"gemini": 100, "openai": 2048}
+# Structured facts whose embedding is within this cosine distance of an existing fact are semantic duplicates
+EMBEDDING_DEDUP_MAX_COSINE_DISTANCE = 0.05
 IMAGE_GENERATION_MODEL = "stable-diffusion-v1-6" # Default model for Stability AI
+IMAGE_GENERATION_MAX_CONCURRENCY = 5 # Max parallel Stability AI requests per content item
 VIDEO_GENERATION_SETTINGS = {
     "max_duration_seconds": 90,
+    "fps": 24,
     "voice_language_code": {"hi": "hi-IN", "en": "en-IN"},
-    "voice_name": {"hi": "hi-IN-Wavenet-B", "en": "en-IN-Wavenet-D"} # Example voices, check GCP TTS docs
+    "voice_name": {"hi": "hi-IN-Wavenet-B", "en": "en-IN-Wavenet-D"}, # Example voices, check GCP TTS docs
+    # ffmpeg video encoder. Use a hardware encoder where available: "h264_nvenc" (NVIDIA),
+    # "h264_qsv" (Intel Quick Sync) or "h264_videotoolbox" (macOS). Falls back to libx264 on failure.
+    "save_frames": False, # Also write generated video frames to disk (debugging only)
+    "video_codec": os.getenv("VIDEO_CODEC", "libx264"),
+    "hw_encoder_ffmpeg_params": {
+        "h264_nvenc": ["-preset", "p4", "-b:v", "3M"],
+        "h264_qsv": ["-preset", "medium", "-b:v", "3M"],
+        "h264_videotoolbox": ["-b:v", "3M"],
+    }
 }
 
 # --- SEO Settings ---
 MIN_KEYWORDS_PER_ARTICLE = 5
 MAX_KEYWORDS_PER_ARTICLE = 15
+PUBLISH_MAX_CONCURRENCY = 10 # Max parallel WordPress publishes per batch
+SEO_BATCH_SIZE = 8 # Articles marshalled into one SEO prompt (larger batches give diminishing returns)
 
 # --- Monetization Settings ---
 ADSENSE_PUBLISHER_ID = os.getenv("ADSENSE_PUBLISHER_ID") # Your AdSense Publisher ID
@@ -71,9 +127,24 @@ AMAZON_ASSOCIATES_TAG = os.getenv("AMAZON_ASSOCIATES_TAG") # Your Amazon Associa
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
 
+# --- API Rate Limits (requests per minute, per worker process; see utils/rate_limiter.py) ---
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+# Token budgets (prompt + max output tokens) for the LLM providers, per worker process like the request limits
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "100000"))
+OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "150000"))
+WORDPRESS_REQUESTS_PER_MINUTE = int(os.getenv("WORDPRESS_REQUESTS_PER_MINUTE", "60"))
+RAZORPAY_REQUESTS_PER_MINUTE = int(os.getenv("RAZORPAY_REQUESTS_PER_MINUTE", "60"))
+
+# --- Logging ---
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json") # "json" (one orjson object per line) or "text"
+
 # --- Agent Orchestration (Celery) ---
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0") # 'redis' if using docker-compose
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
+# Known URLs/content hashes/embedding hashes: per-process LRU in front of Redis sets shared by all workers
+HASH_SEEN_CACHE_MAX_ENTRIES = 100000
+HASH_SEEN_CACHE_REDIS_URL = os.getenv("HASH_SEEN_CACHE_REDIS_URL", CELERY_BROKER_URL) # Empty to disable the Redis tier
 
 # --- Legal & Compliance ---
 # MeitY Advisory (March 2024) requires labeling of AI-generated content.
@@ -82,3 +153,12 @@ AI_CONTENT_DISCLAIMER_ENABLED = True
 
 # --- Paths ---
 DATA_DIR = "data"
+# Persistent cache of deterministic LLM responses (quality checks, image prompts)
+LLM_CACHE_PATH = os.path.join(DATA_DIR, "cache", "llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600
+# Persistent cache of embedding vectors (float32), keyed by model and input text. Embeddings never expire.
+EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, "cache", "embeddings.sqlite3")
+# Bloom filter of StructuredFact embedding hashes (~12 MB at 10M entries / 1% false positives)
+EMBEDDING_BLOOM_PATH = os.path.join(DATA_DIR, "bloom", "emb.bf")
+EMBEDDING_BLOOM_CAPACITY = 10_000_000
+EMBEDDING_BLOOM_ERROR_RATE = 0.01
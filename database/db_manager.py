@@ -1,12 +1,27 @@
 # database/db_manager.py
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine, text
-from database.models import Base, RawIngestedData, StructuredFact, GeneratedContent, PublishedContent, PerformanceMetric
-from config.settings import DATABASE_URL
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine, text, func, update, insert, or_, select, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database.models import Base, RawIngestedData, StructuredFact, GeneratedContent, ContentChunk, PublishedContent, \
+    PerformanceMetric
+from config.settings import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, \
+    EMBEDDING_BLOOM_PATH, EMBEDDING_BLOOM_CAPACITY, EMBEDDING_BLOOM_ERROR_RATE, WORK_CLAIM_TIMEOUT_MINUTES
 from utils.logger import setup_logger
-import hashlib
+from utils.cache import HashSeenCache
+from utils.bloom import BloomFilter
+import logging
+import threading
+import orjson  # Fast C JSON parsing/serialization
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 logger = setup_logger("DBManager")
+_SCHEMA_LOCK_KEY = 0x416C6368  # Arbitrary app-wide key for pg_advisory_xact_lock around schema creation
+
+
+def _json_dumps(value) -> str:
+    """orjson-backed json_serializer for JSON columns (integer dict keys become strings, as with json.dumps)."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
 
 
 class DBManager:
@@ -16,19 +31,49 @@ class DBManager:
     """
 
     def __init__(self):
-        self.engine = create_engine(DATABASE_URL)
+        # psycopg2 fast executemany: batched INSERTs are sent as multi-row VALUES pages instead of row by row
+        # Pool sized for concurrent Celery tasks; pre-ping transparently replaces connections dropped by Postgres
+        self.engine = create_engine(DATABASE_URL, executemany_mode="values_plus_batch",
+                                    executemany_values_page_size=1000,
+                                    pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                                    pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+                                    pool_pre_ping=True,
+                                    query_cache_size=1200,  # Compiled-SQL cache; room for every hot statement
+                                    # JSON columns are encoded/decoded with orjson instead of the stdlib json module
+                                    json_serializer=_json_dumps, json_deserializer=orjson.loads)
         # Ensure tables are created when DBManager is initialized
         try:
-            Base.metadata.create_all(self.engine)
+            with self.engine.begin() as conn:
+                # Every worker process builds a DBManager at startup: a transaction-scoped advisory lock makes
+                # them create the schema one at a time instead of racing on pg_extension/pg_type entries
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _SCHEMA_LOCK_KEY})
+                # The halfvec embedding column and its HNSW index need the pgvector extension (0.7+)
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                Base.metadata.create_all(conn)
             logger.info("Database tables ensured to be created.")
         except Exception as e:
             logger.error(f"Failed to create database tables: {e}")
             raise  # Re-raise to halt if DB isn't ready
 
-        self.Session = sessionmaker(bind=self.engine)
+        # One session per thread, reused across calls; objects stay readable after commit (no reload on access)
+        self.Session = scoped_session(sessionmaker(bind=self.engine, expire_on_commit=False))
+        # Memo of keys known to exist, consulted before the existence queries
+        self._seen_caches = {
+            RawIngestedData.url: HashSeenCache("raw_urls"),
+            GeneratedContent.content_hash: HashSeenCache("content_hashes"),
+            StructuredFact.embedding_hash: HashSeenCache("embedding_hashes"),
+        }
+        # Existence-check statements built once; `values` is an expanding IN parameter, so every call reuses
+        # the same statement (and its compiled form) whatever the number of keys
+        self._existing_stmts = {column: select(column).where(column.in_(bindparam("values", expanding=True)))
+                                for column in self._seen_caches}
+        self._emb_bloom = None  # Built lazily on the first embedding-hash check (see _embedding_bloom)
+        self._emb_bloom_lock = threading.Lock()
 
     def get_session(self):
-        """Returns a new database session."""
+        """Returns the thread's database session."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Connection pool: {self.engine.pool.status()}")
         return self.Session()
 
     def insert_record(self, record_obj):
@@ -36,8 +81,8 @@ class DBManager:
         session = self.get_session()
         try:
             session.add(record_obj)
-            session.commit()
-            session.refresh(record_obj)  # Refresh to get auto-generated IDs
+            session.commit()  # IDs come back from INSERT ... RETURNING; expire_on_commit=False keeps them loaded
+            self._mark_record_seen(record_obj)
             logger.debug(f"Inserted: {record_obj}")
             return record_obj
         except Exception as e:
@@ -47,6 +92,49 @@ class DBManager:
         finally:
             session.close()
 
+    def bulk_insert_mappings(self, model, rows: list[dict]) -> bool:
+        """Inserts many rows of a model (given as column dicts) in a single transaction and batched INSERT."""
+        if not rows:
+            return True
+        session = self.get_session()
+        try:
+            session.execute(insert(model), rows)  # executemany -> multi-row INSERT ... VALUES pages
+            session.commit()
+            logger.debug(f"Bulk inserted {len(rows)} {model.__name__} rows.")
+            return True
+        except Exception as e:
+            session.rollback()
+            logger.error(f"DB Bulk Insert Error for {model.__name__}: {e}")
+            return False
+        finally:
+            session.close()
+
+    def insert_raw_data_batch(self, rows: list[dict]) -> dict[str, int]:
+        """
+        Inserts many RawIngestedData rows (column dicts) with one batched INSERT in a single transaction.
+        URLs that already exist are skipped (`ON CONFLICT (url) DO NOTHING`).
+        Returns {url: new record ID} for the inserted rows.
+        """
+        if not rows:
+            return {}
+        session = self.get_session()
+        try:
+            inserted = session.execute(
+                pg_insert(RawIngestedData).on_conflict_do_nothing(index_elements=[RawIngestedData.url]).returning(
+                    RawIngestedData.id, RawIngestedData.url),
+                rows
+            ).all()
+            session.commit()
+            self._mark_seen(RawIngestedData.url, [url for _, url in inserted])
+            logger.debug(f"Bulk inserted {len(inserted)} of {len(rows)} RawIngestedData rows.")
+            return {url: record_id for record_id, url in inserted}
+        except Exception as e:
+            session.rollback()
+            logger.error(f"DB Bulk Insert Error for RawIngestedData: {e}")
+            return {}
+        finally:
+            session.close()
+
     def update_record(self, record_obj):
         """Updates an existing record in the database."""
         session = self.get_session()
@@ -62,6 +150,22 @@ class DBManager:
         finally:
             session.close()
 
+    def commit_batch(self, record_objs: list) -> bool:
+        """Inserts/updates several records (new or detached) atomically in a single transaction."""
+        session = self.get_session()
+        try:
+            for record_obj in record_objs:
+                session.merge(record_obj)  # merge inserts new objects and updates detached ones
+            session.commit()
+            logger.debug(f"Committed batch of {len(record_objs)} records.")
+            return True
+        except Exception as e:
+            session.rollback()
+            logger.error(f"DB Batch Commit Error: {e}")
+            return False
+        finally:
+            session.close()
+
     def query_records(self, model, **filters):
         """Queries records from a specified model with optional filters."""
         session = self.get_session()
@@ -80,13 +184,26 @@ class DBManager:
         """Retrieves a record by its ID."""
         session = self.get_session()
         try:
-            return session.query(model).get(record_id)
+            return session.get(model, record_id)  # Always a PK SELECT: each call's session starts empty
         except Exception as e:
             logger.error(f"DB Get by ID Error for {model.__name__} (ID: {record_id}): {e}")
             return None
         finally:
             session.close()
 
+    def get_records_by_ids(self, model, record_ids: list[int]) -> dict:
+        """Retrieves several records by ID in a single query. Returns {id: record} (missing IDs are absent)."""
+        if not record_ids:
+            return {}
+        session = self.get_session()
+        try:
+            return {record.id: record for record in session.query(model).filter(model.id.in_(set(record_ids))).all()}
+        except Exception as e:
+            logger.error(f"DB Get by IDs Error for {model.__name__}: {e}")
+            return {}
+        finally:
+            session.close()
+
     def get_record_by_url(self, model, url_field, url):
         """Retrieves a record by a URL field."""
         session = self.get_session()
@@ -98,39 +215,225 @@ class DBManager:
         finally:
             session.close()
 
-    def is_raw_data_url_exists(self, url: str) -> bool:
-        """Checks if a URL already exists in RawIngestedData."""
+    def _existing_values(self, column, values) -> set:
+        """
+        Returns the subset of `values` present in `column`. Keys already known to exist are answered by the
+        column's HashSeenCache; the rest use a single `SELECT column ... WHERE column IN (...)`.
+        """
+        unique_values = set(values)
+        if not unique_values:
+            return set()
+        seen_cache = self._seen_caches[column]
+        known = seen_cache.filter_seen(unique_values)
+        unknown = unique_values - known
+        if not unknown:
+            return known
         session = self.get_session()
         try:
-            return session.query(RawIngestedData).filter_by(url=url).first() is not None
+            found = set(session.scalars(self._existing_stmts[column], {"values": list(unknown)}))
         except Exception as e:
-            logger.error(f"Error checking raw data URL existence: {e}")
-            return False
+            logger.error(f"Error checking existence of {column}: {e}")
+            return known
         finally:
             session.close()
+        seen_cache.add(found)
+        return known | found
+
+    def _mark_seen(self, column, values) -> None:
+        """Records committed keys in the column's HashSeenCache."""
+        self._seen_caches[column].add(values)
+
+    def _mark_record_seen(self, record_obj) -> None:
+        """Records the memoized key columns of a newly committed ORM record."""
+        for column in self._seen_caches:
+            if isinstance(record_obj, column.class_):
+                self._mark_seen(column, [getattr(record_obj, column.key)])
+
+    def existing_urls(self, urls: list[str]) -> set[str]:
+        """Returns the subset of the given URLs that already exist in RawIngestedData (one query)."""
+        return self._existing_values(RawIngestedData.url, urls)
+
+    def existing_content_hashes(self, content_hashes: list[str]) -> set[str]:
+        """Returns the subset of the given content hashes that already exist in GeneratedContent (one query)."""
+        return self._existing_values(GeneratedContent.content_hash, content_hashes)
+
+    def existing_embedding_hashes(self, embedding_hashes: list[str]) -> set[str]:
+        """
+        Returns the subset of the given embedding hashes that already exist in StructuredFact (one query).
+        Hashes the Bloom filter has never seen are new without a lookup. The filter may miss hashes inserted
+        by other worker processes since it was loaded; the insert's ON CONFLICT still catches those.
+        """
+        bloom = self._embedding_bloom()
+        if bloom is not None:
+            embedding_hashes = [embedding_hash for embedding_hash in embedding_hashes if embedding_hash in bloom]
+        return self._existing_values(StructuredFact.embedding_hash, embedding_hashes)
+
+    def _embedding_bloom(self) -> BloomFilter | None:
+        """
+        Returns the embedding-hash Bloom filter, loading it from EMBEDDING_BLOOM_PATH on first use and
+        catching up with facts inserted since it was saved (or building it from scratch). None if unavailable.
+        """
+        if self._emb_bloom is not None:
+            return self._emb_bloom
+        with self._emb_bloom_lock:
+            if self._emb_bloom is not None:
+                return self._emb_bloom
+            bloom = BloomFilter.load(EMBEDDING_BLOOM_PATH, EMBEDDING_BLOOM_CAPACITY, EMBEDDING_BLOOM_ERROR_RATE) \
+                or BloomFilter(EMBEDDING_BLOOM_CAPACITY, EMBEDDING_BLOOM_ERROR_RATE)
+            session = self.get_session()
+            try:
+                added = 0
+                for fact_id, embedding_hash in session.query(StructuredFact.id, StructuredFact.embedding_hash).filter(
+                        StructuredFact.id > bloom.watermark, StructuredFact.embedding_hash.isnot(None)
+                ).order_by(StructuredFact.id).yield_per(10000):
+                    bloom.add(embedding_hash)
+                    bloom.watermark = fact_id
+                    added += 1
+            except Exception as e:
+                logger.error(f"Error warming the embedding hash Bloom filter: {e}")
+                return None
+            finally:
+                session.close()
+            if added:
+                try:
+                    bloom.save(EMBEDDING_BLOOM_PATH)
+                except OSError as e:
+                    logger.warning(f"Could not persist the embedding hash Bloom filter: {e}")
+            logger.info(f"Embedding hash Bloom filter ready ({added} hashes added since last save).")
+            self._emb_bloom = bloom
+            return bloom
+
+    def is_raw_data_url_exists(self, url: str) -> bool:
+        """Checks if a URL already exists in RawIngestedData."""
+        return bool(self.existing_urls([url]))
 
     def is_content_hash_exists(self, content_hash: str) -> bool:
         """Checks if a content hash already exists in GeneratedContent."""
+        return bool(self.existing_content_hashes([content_hash]))
+
+    def is_near_duplicate_content(self, chunk_hashes: list[str], threshold: float) -> bool:
+        """
+        Checks if at least `threshold` (0-1) of the given content chunk hashes already
+        appear in a single existing GeneratedContent record.
+        """
+        unique_hashes = set(chunk_hashes)
+        if not unique_hashes:
+            return False
         session = self.get_session()
         try:
-            return session.query(GeneratedContent).filter_by(content_hash=content_hash).first() is not None
+            best_overlap = session.query(func.count(func.distinct(ContentChunk.chunk_hash))).filter(
+                ContentChunk.chunk_hash.in_(unique_hashes)
+            ).group_by(ContentChunk.generated_content_id).order_by(
+                func.count(func.distinct(ContentChunk.chunk_hash)).desc()
+            ).limit(1).scalar()
+            return (best_overlap or 0) / len(unique_hashes) >= threshold
         except Exception as e:
-            logger.error(f"Error checking content hash existence: {e}")
+            logger.error(f"Error checking near-duplicate content: {e}")
             return False
         finally:
             session.close()
 
+    def insert_content_and_mark_fact_processed(self, generated_content: GeneratedContent, structured_fact_id: int,
+                                               chunk_hashes: list[str]) -> int | None:
+        """
+        Inserts a GeneratedContent record with its content chunk hashes and marks the source
+        StructuredFact as processed, all in one transaction.
+        Returns the new GeneratedContent ID, or None on failure (nothing is written).
+        """
+        session = self.get_session()
+        try:
+            session.add(generated_content)
+            session.flush()  # INSERT ... RETURNING id
+            session.add_all([ContentChunk(generated_content_id=generated_content.id, chunk_hash=chunk_hash)
+                             for chunk_hash in set(chunk_hashes)])
+            session.execute(update(StructuredFact).where(StructuredFact.id == structured_fact_id).values(
+                is_processed_for_content=True))
+            session.commit()
+            self._mark_seen(GeneratedContent.content_hash, [generated_content.content_hash])
+            logger.debug(f"Inserted: {generated_content}")
+            return generated_content.id
+        except Exception as e:
+            session.rollback()
+            logger.error(f"DB Insert Error for generated content of fact {structured_fact_id}: {e}")
+            return None
+        finally:
+            session.close()
+
+    def upsert_fact_and_mark_processed(self, raw_data_id: int, fact_values: dict) -> int | None:
+        """
+        Inserts a StructuredFact and updates the status of its RawIngestedData record in one transaction.
+        The insert is `ON CONFLICT (embedding_hash) DO NOTHING`, so a semantic duplicate is detected
+        by the same statement: the raw record is then marked DUPLICATE_PARSED instead of PARSED.
+        Returns the new StructuredFact ID, or None for duplicates and failures.
+        """
+        session = self.get_session()
+        try:
+            fact_id = session.execute(
+                pg_insert(StructuredFact).values(**fact_values).on_conflict_do_nothing(
+                    index_elements=[StructuredFact.embedding_hash]
+                ).returning(StructuredFact.id)
+            ).scalar()
+            raw_status = "PARSED" if fact_id is not None else "DUPLICATE_PARSED"
+            session.execute(update(RawIngestedData).where(RawIngestedData.id == raw_data_id).values(
+                status=raw_status))
+            session.commit()
+            self._mark_seen(StructuredFact.embedding_hash, [fact_values.get("embedding_hash")])  # New or conflicting
+            if self._emb_bloom is not None and fact_values.get("embedding_hash"):
+                self._emb_bloom.add(fact_values["embedding_hash"])
+            if fact_id is None:
+                logger.info(f"Structured fact for raw data {raw_data_id} is semantically similar (embedding hash).")
+            return fact_id
+        except Exception as e:
+            session.rollback()
+            logger.error(f"DB Upsert Error for StructuredFact of raw data {raw_data_id}: {e}")
+            return None
+        finally:
+            session.close()
+
     def is_embedding_hash_exists(self, embedding_hash: str) -> bool:
-        """Checks if an embedding hash already exists in StructuredFact (for semantic deduplication)."""
+        """Checks if an embedding hash already exists in StructuredFact (exact-duplicate pre-check)."""
+        return bool(self.existing_embedding_hashes([embedding_hash]))
+
+    def is_near_duplicate_embedding(self, embedding: list[float], max_cosine_distance: float) -> bool:
+        """
+        Checks if a StructuredFact with an embedding within `max_cosine_distance` of the given one exists
+        (semantic deduplication). Fetches only the nearest neighbour's distance: the HNSW index on
+        structured_facts.embedding serves `ORDER BY distance LIMIT 1`, not a `WHERE distance < x` filter.
+        """
         session = self.get_session()
         try:
-            return session.query(StructuredFact).filter_by(embedding_hash=embedding_hash).first() is not None
+            distance = StructuredFact.embedding.cosine_distance(embedding)
+            nearest_distance = session.query(distance).filter(StructuredFact.embedding.isnot(None)).order_by(
+                distance).limit(1).scalar()
+            return nearest_distance is not None and nearest_distance < max_cosine_distance
         except Exception as e:
-            logger.error(f"Error checking embedding hash existence: {e}")
+            logger.error(f"Error checking near-duplicate embedding: {e}")
             return False
         finally:
             session.close()
 
+    def find_semantic_duplicate_content(self, embedding, language: str,
+                                        max_cosine_distance: float) -> int | None:
+        """
+        Returns the ID of existing GeneratedContent in `language` whose source fact embedding is within
+        `max_cosine_distance` of the given one, or None. Like `is_near_duplicate_embedding`, only the nearest
+        neighbour is fetched so the HNSW index on generated_content.source_embedding is used.
+        """
+        session = self.get_session()
+        try:
+            distance = GeneratedContent.source_embedding.cosine_distance(embedding)
+            nearest = session.query(GeneratedContent.id, distance).filter(
+                GeneratedContent.source_embedding.isnot(None), GeneratedContent.language == language
+            ).order_by(distance).limit(1).first()
+            if nearest is not None and nearest[1] < max_cosine_distance:
+                return nearest[0]
+            return None
+        except Exception as e:
+            logger.error(f"Error searching semantically duplicate content: {e}")
+            return None
+        finally:
+            session.close()
+
     def get_unprocessed_raw_data(self, limit: int = 50):
         """Retrieves a batch of raw data records that need parsing."""
         session = self.get_session()
@@ -142,19 +445,58 @@ class DBManager:
         finally:
             session.close()
 
-    def get_structured_data_for_generation(self, limit: int = 10):
-        """Retrieves structured facts that haven't been used for content generation yet."""
+    def get_structured_data_for_generation(self, limit: int = 10, after_id: int = 0):
+        """
+        Retrieves structured facts that haven't been used for content generation yet, oldest (lowest ID) first.
+        Keyset pagination: only facts with ID > `after_id` are returned, so each page is a seek on the
+        partial index of unprocessed facts regardless of table size.
+        """
         session = self.get_session()
         try:
-            # Order by timestamp to process older facts first
-            return session.query(StructuredFact).filter_by(is_processed_for_content=False).order_by(
-                StructuredFact.timestamp).limit(limit).all()
+            return session.query(StructuredFact).filter(
+                StructuredFact.is_processed_for_content.is_(False),
+                StructuredFact.id > after_id
+            ).order_by(StructuredFact.id).limit(limit).all()
         except Exception as e:
             logger.error(f"Error getting structured data for generation: {e}")
             return []
         finally:
             session.close()
 
+    def _claim_rows(self, model, filters: list, order_by, limit: int) -> list:
+        """
+        Atomically claims up to `limit` queue rows of `model` matching `filters` for this worker:
+        `SELECT ... FOR UPDATE SKIP LOCKED` skips rows another worker is claiming at the same moment, and
+        rows claimed within WORK_CLAIM_TIMEOUT_MINUTES are excluded, so concurrent callers get disjoint rows.
+        Claims older than the timeout (e.g. from a crashed worker) are taken over.
+        """
+        session = self.get_session()
+        try:
+            now = datetime.utcnow()
+            claim_expiry = now - timedelta(minutes=WORK_CLAIM_TIMEOUT_MINUTES)
+            rows = session.query(model).filter(
+                *filters, or_(model.claimed_at.is_(None), model.claimed_at < claim_expiry)
+            ).order_by(order_by).limit(limit).with_for_update(skip_locked=True).all()
+            for row in rows:
+                row.claimed_at = now
+            session.commit()
+            return rows
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error claiming {model.__name__} rows: {e}")
+            return []
+        finally:
+            session.close()
+
+    def claim_unprocessed_raw_data(self, limit: int = 50):
+        """Claims a batch of raw data records that need parsing (see `_claim_rows`)."""
+        return self._claim_rows(RawIngestedData, [RawIngestedData.status == "NEW"], RawIngestedData.id, limit)
+
+    def claim_structured_data_for_generation(self, limit: int = 10, after_id: int = 0):
+        """Claims structured facts for content generation, keyset-paged like `get_structured_data_for_generation`."""
+        return self._claim_rows(StructuredFact, [StructuredFact.is_processed_for_content.is_(False),
+                                                 StructuredFact.id > after_id], StructuredFact.id, limit)
+
     def get_generated_content_for_monetization_or_publishing(self, limit: int = 5):
         """Retrieves content that is generated but not yet monetized/published."""
         session = self.get_session()
@@ -181,3 +523,26 @@ class DBManager:
         finally:
             session.close()
 
+    def get_metric_averages_since(self, cutoff) -> list[tuple[int, str, float]]:
+        """
+        Returns (published_content_id, metric_type, average value) for metrics recorded since `cutoff`,
+        aggregated in SQL so only one row per content item and metric type is materialized.
+        """
+        session = self.get_session()
+        try:
+            return session.query(
+                PerformanceMetric.published_content_id, PerformanceMetric.metric_type, func.avg(PerformanceMetric.value)
+            ).filter(PerformanceMetric.timestamp >= cutoff).group_by(
+                PerformanceMetric.published_content_id, PerformanceMetric.metric_type
+            ).all()
+        except Exception as e:
+            logger.error(f"Error getting metric averages since {cutoff}: {e}")
+            return []
+        finally:
+            session.close()
+
+
+@lru_cache(maxsize=1)
+def get_db_manager() -> DBManager:
+    """Returns the process-wide DBManager, so all agents share one engine and connection pool."""
+    return DBManager()
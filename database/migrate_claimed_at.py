@@ -0,0 +1,23 @@
+# database/migrate_claimed_at.py
+# One-shot migration: adds the claimed_at work-queue columns (see DBManager._claim_rows) to existing tables.
+# create_all only creates missing tables, so databases created before these columns need this run once
+# before starting the new workers: python -m database.migrate_claimed_at
+from sqlalchemy import create_engine, text
+from config.settings import DATABASE_URL
+from utils.logger import setup_logger
+
+logger = setup_logger("ClaimedAtMigration")
+
+_CLAIM_TABLES = ("raw_ingested_data", "structured_facts")
+
+
+def migrate() -> None:
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conn:
+        for table in _CLAIM_TABLES:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITHOUT TIME ZONE"))
+    logger.info(f"Ensured claimed_at columns on {', '.join(_CLAIM_TABLES)}.")
+
+
+if __name__ == "__main__":
+    migrate()
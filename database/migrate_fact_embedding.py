@@ -0,0 +1,36 @@
+# database/migrate_fact_embedding.py
+# One-shot migration: converts structured_facts.embedding from the original JSON column, or the earlier
+# float32 vector column, to the pgvector halfvec column of StructuredFact and (re)creates its HNSW index,
+# which create_all does not do for an existing table.
+# Run once per database before starting the new workers: python -m database.migrate_fact_embedding
+from sqlalchemy import create_engine, text
+from config.settings import DATABASE_URL, EMBEDDING_DIM
+from utils.logger import setup_logger
+
+logger = setup_logger("FactEmbeddingMigration")
+
+
+def migrate() -> None:
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        column_type = conn.execute(text(
+            "SELECT udt_name FROM information_schema.columns "
+            "WHERE table_name = 'structured_facts' AND column_name = 'embedding'"
+        )).scalar()
+        if column_type in ("json", "jsonb", "vector"):
+            logger.info(f"Converting structured_facts.embedding from {column_type} to halfvec({EMBEDDING_DIM}).")
+            # A vector column's index uses vector_cosine_ops, which doesn't apply to halfvec: rebuilt below
+            conn.execute(text("DROP INDEX IF EXISTS ix_structured_facts_embedding_hnsw"))
+            # JSON arrays and vectors share pgvector's text format; JSON nulls become SQL NULL
+            conn.execute(text(
+                f"ALTER TABLE structured_facts ALTER COLUMN embedding TYPE halfvec({EMBEDDING_DIM}) "
+                f"USING NULLIF(embedding::text, 'null')::halfvec"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_structured_facts_embedding_hnsw ON structured_facts "
+            "USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)"))
+    logger.info("Ensured structured_facts.embedding is a halfvec column with its HNSW index.")
+
+
+if __name__ == "__main__":
+    migrate()
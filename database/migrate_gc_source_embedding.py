@@ -0,0 +1,24 @@
+# database/migrate_gc_source_embedding.py
+# One-shot migration: adds generated_content.source_embedding and its HNSW index (semantic reuse check in
+# ContentGenerationAgent) to existing databases, which create_all does not alter.
+# Run once per database before starting the new workers: python -m database.migrate_gc_source_embedding
+from sqlalchemy import create_engine, text
+from config.settings import DATABASE_URL, EMBEDDING_DIM
+from utils.logger import setup_logger
+
+logger = setup_logger("SourceEmbeddingMigration")
+
+
+def migrate() -> None:
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE generated_content ADD COLUMN IF NOT EXISTS source_embedding HALFVEC({EMBEDDING_DIM})"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_gc_source_embedding_hnsw ON generated_content "
+            "USING hnsw (source_embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)"))
+    logger.info("Ensured generated_content.source_embedding and its HNSW index.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,40 @@
+# database/migrate_indexes.py
+# One-shot migration: creates the indexes declared in database/models.py on tables that already existed,
+# since create_all only indexes the tables it creates. Each index is built CONCURRENTLY, so workers can
+# keep running. Run once per database: python -m database.migrate_indexes
+# A failed concurrent build leaves an INVALID index that IF NOT EXISTS then skips: drop it and re-run.
+from sqlalchemy import create_engine, text
+from config.settings import DATABASE_URL
+from utils.logger import setup_logger
+
+logger = setup_logger("IndexMigration")
+
+_INDEX_STATEMENTS = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_raw_status_new ON raw_ingested_data (id) WHERE status = 'NEW'",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_gc_status ON generated_content (status)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_published_content_generated_content_id "
+    "ON published_content (generated_content_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_performance_metrics_published_content_id "
+    "ON performance_metrics (published_content_id)",
+    # Generation queue is keyset-paged by id; the earlier timestamp-ordered partial index is superseded
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sf_unprocessed_id ON structured_facts (id) "
+    "WHERE is_processed_for_content = false",
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_sf_unprocessed_ts",
+    # Covering index for DBManager.get_metric_averages_since
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_perfmetric_ts_cid_type "
+    "ON performance_metrics (timestamp, published_content_id, metric_type) INCLUDE (value)",
+]
+
+
+def migrate() -> None:
+    engine = create_engine(DATABASE_URL)
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in _INDEX_STATEMENTS:
+            logger.info(f"Running: {statement}")
+            conn.execute(text(statement))
+    logger.info("Indexes are up to date.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,48 @@
+# database/migrate_raw_html_zstd.py
+# One-shot migration: converts raw_ingested_data.raw_html from TEXT to zstd-compressed BYTEA.
+# Run once per database before starting the new workers: python -m database.migrate_raw_html_zstd
+from sqlalchemy import create_engine, text
+from config.settings import DATABASE_URL
+from utils.compression import zstd_compress
+from utils.logger import setup_logger
+
+logger = setup_logger("RawHtmlMigration")
+
+BATCH_SIZE = 500
+_ZSTD_FRAME_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def migrate() -> None:
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conn:
+        column_type = conn.execute(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'raw_ingested_data' AND column_name = 'raw_html'"
+        )).scalar()
+        if column_type == "text":
+            logger.info("Converting raw_html from TEXT to BYTEA (UTF-8).")
+            conn.execute(text(
+                "ALTER TABLE raw_ingested_data ALTER COLUMN raw_html TYPE BYTEA USING convert_to(raw_html, 'UTF8')"))
+
+    # Compress in id-ordered batches, each in its own transaction; already-compressed rows are skipped,
+    # so the migration can be interrupted and re-run safely
+    last_id = 0
+    migrated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, raw_html FROM raw_ingested_data WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+            if not rows:
+                break
+            updates = [{"id": row_id, "raw_html": zstd_compress(bytes(raw_html))}
+                       for row_id, raw_html in rows if bytes(raw_html[:4]) != _ZSTD_FRAME_MAGIC]
+            if updates:
+                conn.execute(text("UPDATE raw_ingested_data SET raw_html = :raw_html WHERE id = :id"), updates)
+            migrated += len(updates)
+            last_id = rows[-1][0]
+    logger.info(f"Compressed raw_html for {migrated} raw data records.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,71 @@
+# database/migrate_reembed_facts.py
+# One-shot backfill: re-embeds every structured fact with the current embedding model (see
+# LLMInterface.embedding_models) and recomputes its embedding_hash, so semantic dedup never compares vectors
+# from two different models. generated_content.source_embedding rows copied from a fact's old embedding are
+# moved to the new one. Run once per database after changing the embedding model, before starting the new
+# workers: python -m database.migrate_reembed_facts [after_id]
+# Facts are processed in id-ordered batches, each in its own transaction; pass the last logged id to resume.
+import sys
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from config.settings import DATABASE_URL, EMBEDDING_BATCH_MAX_INPUTS
+from agents.data_ingestion import DataIngestionAgent
+from utils.cache import CachedEmbedder, embedding_hash
+from utils.llm_interface import get_llm_interface
+from utils.logger import setup_logger
+
+logger = setup_logger("FactReembedMigration")
+
+BATCH_SIZE = EMBEDDING_BATCH_MAX_INPUTS["gemini"]
+
+
+def _halfvec_literal(embedding) -> str:
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+
+def migrate(after_id: int = 0) -> None:
+    engine = create_engine(DATABASE_URL)
+    embedder = CachedEmbedder(get_llm_interface())
+    last_id = after_id
+    reembedded = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT id, data FROM structured_facts WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        embeddings = embedder.embed_text_many([DataIngestionAgent._embedding_text(data) for _, data in rows])
+
+        with engine.begin() as conn:
+            for (fact_id, _), embedding in zip(rows, embeddings):
+                if embedding is None:
+                    logger.error(f"Failed to re-embed structured fact {fact_id}. Re-run from an earlier id.")
+                    continue
+                params = {"id": fact_id, "embedding": _halfvec_literal(embedding), "hash": embedding_hash(embedding)}
+                # Content generated from this fact carries a copy of its old embedding: move it along
+                conn.execute(text(
+                    "UPDATE generated_content SET source_embedding = CAST(:embedding AS halfvec) "
+                    "WHERE source_embedding = (SELECT embedding FROM structured_facts WHERE id = :id)"
+                ), params)
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(
+                            "UPDATE structured_facts SET embedding = CAST(:embedding AS halfvec), "
+                            "embedding_hash = :hash WHERE id = :id"
+                        ), params)
+                except IntegrityError:
+                    # Another fact already has this hash under the new model: keep the vector, drop the hash
+                    logger.warning(f"Structured fact {fact_id} duplicates another fact's embedding hash.")
+                    conn.execute(text(
+                        "UPDATE structured_facts SET embedding = CAST(:embedding AS halfvec), "
+                        "embedding_hash = NULL WHERE id = :id"
+                    ), params)
+                reembedded += 1
+        last_id = rows[-1][0]
+        logger.info(f"Re-embedded structured facts up to id {last_id}.")
+    logger.info(f"Re-embedded {reembedded} structured facts.")
+
+
+if __name__ == "__main__":
+    migrate(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
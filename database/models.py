@@ -1,9 +1,12 @@
 # database/models.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Float, JSON, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Float, JSON, ForeignKey, Index, text, \
+    LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
-from config.settings import DATABASE_URL
+from pgvector.sqlalchemy import HALFVEC
+from config.settings import DATABASE_URL, EMBEDDING_DIM
+from utils.compression import zstd_decompress
 
 Base = declarative_base()
 
@@ -15,10 +18,21 @@ class RawIngestedData(Base):
     __tablename__ = 'raw_ingested_data'
     id = Column(Integer, primary_key=True, autoincrement=True)
     url = Column(String, unique=True, nullable=False)
-    raw_html = Column(Text, nullable=False)
+    raw_html = Column(LargeBinary, nullable=False)  # zstd-compressed UTF-8 HTML (see utils/compression.py)
     extracted_json = Column(JSON, nullable=True)  # Initial data extracted by scraper
     timestamp = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="NEW")  # NEW, PARSED, FAILED_PARSING, DUPLICATE_PARSED
+    claimed_at = Column(DateTime, nullable=True)  # Set when a worker claims the record for parsing
+
+    __table_args__ = (
+        # Partial index for the parsing queue (DBManager.claim_unprocessed_raw_data); stays as small as the backlog
+        Index('ix_raw_status_new', 'id', postgresql_where=text("status = 'NEW'")),
+    )
+
+    @property
+    def decoded_html(self) -> str:
+        """The stored HTML, decompressed and decoded."""
+        return zstd_decompress(self.raw_html).decode("utf-8")
 
     def __repr__(self):
         return f"<RawIngestedData(id={self.id}, url='{self.url}', status='{self.status}')>"
@@ -35,10 +49,20 @@ class StructuredFact(Base):
     niche_category = Column(String, nullable=False)  # e.g., "Solar Pump Troubleshooting", "Gov Scheme Eligibility"
     language = Column(String, nullable=False)  # Language of the original source/intended target
     data = Column(JSON, nullable=False)  # Generic JSON field to store varying structured data based on niche_category
-    embedding = Column(JSON, nullable=True)  # Vector embedding for semantic deduplication
-    embedding_hash = Column(String, unique=True, nullable=True)  # Simple hash of embedding for quick check
+    embedding = Column(HALFVEC(EMBEDDING_DIM), nullable=True)  # FP16 vector embedding for semantic deduplication
+    embedding_hash = Column(String, unique=True, nullable=True)  # Hash of embedding bytes for an O(1) exact check
     timestamp = Column(DateTime, default=datetime.utcnow)
     is_processed_for_content = Column(Boolean, default=False)  # True if content has been generated from this fact
+    claimed_at = Column(DateTime, nullable=True)  # Set when a worker claims the fact for content generation
+
+    __table_args__ = (
+        # HNSW index for approximate nearest-neighbour search by cosine distance (pgvector)
+        Index('ix_structured_facts_embedding_hnsw', 'embedding', postgresql_using='hnsw',
+              postgresql_with={'m': 16, 'ef_construction': 64},
+              postgresql_ops={'embedding': 'halfvec_cosine_ops'}),
+        # Partial index for the generation queue (DBManager.claim_structured_data_for_generation, keyset on id)
+        Index('ix_sf_unprocessed_id', 'id', postgresql_where=text("is_processed_for_content = false")),
+    )
 
     def __repr__(self):
         return f"<StructuredFact(id={self.id}, category='{self.niche_category}', processed={self.is_processed_for_content})>"
@@ -50,7 +74,7 @@ class GeneratedContent(Base):
     """
     __tablename__ = 'generated_content'
     id = Column(Integer, primary_key=True, autoincrement=True)
-    content_hash = Column(String, unique=True, nullable=False)  # MD5 hash of content to prevent exact duplicates
+    content_hash = Column(String(64), unique=True, nullable=False)  # SHA-256 hex digest of content to prevent exact duplicates
     title = Column(String, nullable=False)
     body_html = Column(Text, nullable=False)  # Can be Markdown which is converted to HTML for publishing
     language = Column(String, nullable=False)
@@ -62,26 +86,54 @@ class GeneratedContent(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     status = Column(String,
                     default="GENERATED")  # GENERATED, MONETIZED, PUBLISHED, ERROR_GENERATION, ERROR_MONETIZATION, ERROR_PUBLISH
-
-    published_records = relationship("PublishedContent", back_populates="generated_content")
+    # Embedding of the structured fact the content was generated from, for semantic reuse before generation
+    source_embedding = Column(HALFVEC(EMBEDDING_DIM), nullable=True)
+
+    # Relationships raise instead of lazy loading (no hidden per-row SELECTs); load them explicitly with selectinload
+    published_records = relationship("PublishedContent", back_populates="generated_content", lazy="raise")
+    content_chunks = relationship("ContentChunk", back_populates="generated_content", lazy="raise")
+
+    __table_args__ = (
+        # Status filter for the monetization/publishing queue
+        Index('ix_gc_status', 'status'),
+        # HNSW index for DBManager.find_semantic_duplicate_content (cosine nearest neighbour)
+        Index('ix_gc_source_embedding_hnsw', 'source_embedding', postgresql_using='hnsw',
+              postgresql_with={'m': 16, 'ef_construction': 64},
+              postgresql_ops={'source_embedding': 'halfvec_cosine_ops'}),
+    )
 
     def __repr__(self):
         return f"<GeneratedContent(id={self.id}, title='{self.title[:30]}...', status='{self.status}')>"
 
 
+class ContentChunk(Base):
+    """
+    Stores content-defined chunk hashes of generated articles for near-duplicate detection.
+    """
+    __tablename__ = 'content_chunks'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    generated_content_id = Column(Integer, ForeignKey('generated_content.id'), nullable=False)
+    chunk_hash = Column(String, nullable=False, index=True)  # SHA-256 of one chunk (see utils/chunker.py)
+
+    generated_content = relationship("GeneratedContent", back_populates="content_chunks", lazy="raise")
+
+    def __repr__(self):
+        return f"<ContentChunk(id={self.id}, content_id={self.generated_content_id}, hash='{self.chunk_hash[:12]}')>"
+
+
 class PublishedContent(Base):
     """
     Records details of content published to external platforms.
     """
     __tablename__ = 'published_content'
     id = Column(Integer, primary_key=True, autoincrement=True)
-    generated_content_id = Column(Integer, ForeignKey('generated_content.id'), nullable=False)
+    generated_content_id = Column(Integer, ForeignKey('generated_content.id'), nullable=False, index=True)
     platform = Column(String, nullable=False)  # e.g., "WORDPRESS", "YOUTUBE", "TWITTER"
     external_url = Column(String, unique=True, nullable=False)
     publish_date = Column(DateTime, default=datetime.utcnow)
 
-    generated_content = relationship("GeneratedContent", back_populates="published_records")
-    performance_metrics = relationship("PerformanceMetric", back_populates="published_content")
+    generated_content = relationship("GeneratedContent", back_populates="published_records", lazy="raise")
+    performance_metrics = relationship("PerformanceMetric", back_populates="published_content", lazy="raise")
 
     def __repr__(self):
         return f"<PublishedContent(id={self.id}, platform='{self.platform}', url='{self.external_url}')>"
@@ -93,12 +145,19 @@ class PerformanceMetric(Base):
     """
     __tablename__ = 'performance_metrics'
     id = Column(Integer, primary_key=True, autoincrement=True)
-    published_content_id = Column(Integer, ForeignKey('published_content.id'), nullable=False)
+    published_content_id = Column(Integer, ForeignKey('published_content.id'), nullable=False, index=True)
     metric_type = Column(String, nullable=False)  # e.g., "VIEWS", "CLICKS", "REVENUE_USD", "BOUNCE_RATE"
     value = Column(Float, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
-    published_content = relationship("PublishedContent", back_populates="performance_metrics")
+    published_content = relationship("PublishedContent", back_populates="performance_metrics", lazy="raise")
+
+    __table_args__ = (
+        # Covering index for time-window aggregation (DBManager.get_metric_averages_since):
+        # range scan on timestamp, with every grouped/averaged column readable from the index alone
+        Index('ix_perfmetric_ts_cid_type', 'timestamp', 'published_content_id', 'metric_type',
+              postgresql_include=['value']),
+    )
 
     def __repr__(self):
         return f"<PerformanceMetric(id={self.id}, type='{self.metric_type}', value={self.value})>"
@@ -1,57 +1,109 @@
 # orchestrator/main_orchestrator.py
-from celery import Celery
+import redis
+from datetime import timedelta
+from celery import Celery, group, chain
+from celery.signals import worker_process_init
 from celery.schedules import crontab  # For more advanced scheduling like daily at specific time
 from config.settings import CELERY_BROKER_URL, CELERY_RESULT_BACKEND, NICHE_TOPIC, TARGET_LANGUAGES, \
-    CONTENT_VOLUME_PER_DAY
+    CONTENT_VOLUME_PER_DAY, LLM_BATCH_SIZE, CONTENT_GENERATION_LLM_DEADLINE_SECONDS
 from utils.logger import setup_logger
-from database.db_manager import DBManager
+from utils.llm_interface import llm_deadline
+from database.db_manager import get_db_manager
 from database.models import RawIngestedData, StructuredFact, GeneratedContent
 from agents.data_ingestion import DataIngestionAgent
 from agents.content_generation import ContentGenerationAgent
 from agents.seo_distribution import SEODistributionAgent
 from agents.monetization_feedback import MonetizationFeedbackAgent
-import time
-import random
 
 logger = setup_logger("Orchestrator")
-db_manager = DBManager()
+# Small persistent state shared across scheduler runs (e.g. pagination cursors)
+state_store = redis.Redis.from_url(CELERY_BROKER_URL)
+CONTENT_GENERATION_CURSOR_KEY = "cursor:content_generation:last_fact_id"
 
 # Initialize Celery app
 app = Celery('autonomous_alchemist', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
 app.conf.broker_connection_retry_on_startup = True
 app.conf.timezone = 'Asia/Kolkata'  # India Standard Time
+# Dedicated queues so slow content tasks (LLM + images + video) never hold up the cheap, numerous scrape tasks.
+# Workers subscribe with -Q (see docker-compose.yml); unrouted tasks (schedulers) use the default 'celery' queue.
+app.conf.task_routes = {
+    'orchestrator.main_orchestrator.scrape_url_task': {'queue': 'scrape'},
+    'orchestrator.main_orchestrator.scrape_urls_batch_task': {'queue': 'scrape'},
+    'orchestrator.main_orchestrator.process_raw_data_task': {'queue': 'scrape'},
+    'orchestrator.main_orchestrator.process_raw_data_batch_task': {'queue': 'scrape'},
+    'orchestrator.main_orchestrator.generate_content_pipeline_task': {'queue': 'generate'},
+    'orchestrator.main_orchestrator.generate_content_batch_pipeline_task': {'queue': 'generate'},
+    'orchestrator.main_orchestrator.post_generation_steps_task': {'queue': 'generate'},
+    'orchestrator.main_orchestrator.collect_and_analyze_metrics_task': {'queue': 'metrics'},
+}
+
+# The DB manager and agents are created per worker process, after the fork, rather than at import: the engine's
+# pool, API clients, thread pools and sockets opened in the parent would otherwise be shared (and broken) across
+# prefork children. Beat and the prefork parent never build them, so they never touch Postgres. Code that needs
+# the DB calls get_db_manager() at call time.
+_state = {}
+_AGENT_CLASSES = {
+    'data_ingestion': DataIngestionAgent,
+    'content_generation': ContentGenerationAgent,
+    'seo_distribution': SEODistributionAgent,
+    'monetization_feedback': MonetizationFeedbackAgent,
+}
+
 
-# Initialize Agent instances (Celery tasks will create their own instances or pass necessary data)
-# For simplicity in blueprint, we'll initialize them globally, but in production,
-# tasks might instantiate them or use dependency injection.
-data_ingestion_agent = DataIngestionAgent()
-content_generation_agent = ContentGenerationAgent()
-seo_distribution_agent = SEODistributionAgent()
-monetization_feedback_agent = MonetizationFeedbackAgent()
+@worker_process_init.connect
+def _init_worker_state(**kwargs):
+    """Builds the DB manager and the agents once in each freshly forked worker process."""
+    _state["db"] = get_db_manager()
+    for name, agent_class in _AGENT_CLASSES.items():
+        _state[name] = agent_class()
+    logger.info("Worker process initialized DB manager and agent instances.")
+
+
+def _agent(name: str):
+    """Returns this process's agent, creating it on first use (solo pool, eager mode, beat)."""
+    if name not in _state:
+        _state[name] = _AGENT_CLASSES[name]()
+    return _state[name]
 
 
 # --- Celery Tasks (The Automated Workflow) ---
 
-@app.task(bind=True, max_retries=3, default_retry_delay=300)  # Retry after 5 minutes
-def scrape_url_task(self, url: str) -> None:
-    """Task to scrape a single URL and ingest raw data."""
+@app.task(bind=True, max_retries=3, default_retry_delay=300, rate_limit="5/s")  # Retry after 5 minutes
+def scrape_url_task(self, url: str) -> int | None:
+    """
+    Task to scrape a single URL and ingest raw data. Returns the RawIngestedData ID (None if skipped/failed).
+    Enqueue as `chain(scrape_url_task.s(url), process_raw_data_task.s())` to parse the result.
+    """
     logger.info(f"Task: Scraping URL {url}")
     try:
-        raw_data_id = data_ingestion_agent.scrape_url(url)
-        if raw_data_id:
-            # Chain to parsing task if scrape was successful
-            process_raw_data_task.delay(raw_data_id)
+        return _agent('data_ingestion').scrape_url(url)
     except Exception as e:
         logger.error(f"Scrape task failed for {url}: {e}")
         raise self.retry(exc=e)  # Retry the task on failure
 
 
 @app.task(bind=True, max_retries=3, default_retry_delay=300)
-def process_raw_data_task(self, raw_data_id: int) -> None:
+def scrape_urls_batch_task(self, urls: list[str]) -> list[int]:
+    """
+    Task to scrape several URLs concurrently. Returns the IDs of the new RawIngestedData records.
+    Enqueue as `chain(scrape_urls_batch_task.s(urls), process_raw_data_batch_task.s())` for batched parsing.
+    """
+    logger.info(f"Task: Scraping {len(urls)} URLs")
+    try:
+        return [raw_data_id for raw_data_id in _agent('data_ingestion').scrape_urls(urls) if raw_data_id]
+    except Exception as e:
+        logger.error(f"Scrape batch task failed for {urls}: {e}")
+        raise self.retry(exc=e)
+
+
+@app.task(bind=True, max_retries=3, default_retry_delay=300, rate_limit="5/s")
+def process_raw_data_task(self, raw_data_id: int | None) -> None:
     """Task to parse and filter raw data into structured facts."""
+    if not raw_data_id:  # Upstream scrape in the chain was skipped or failed
+        return
     logger.info(f"Task: Processing raw data ID {raw_data_id}")
     try:
-        structured_fact_id = data_ingestion_agent.process_raw_data(raw_data_id)
+        structured_fact_id = _agent('data_ingestion').process_raw_data(raw_data_id)
         if structured_fact_id:
             logger.info(f"Structured fact created: {structured_fact_id}. Ready for content generation.")
     except Exception as e:
@@ -59,7 +111,22 @@ def process_raw_data_task(self, raw_data_id: int) -> None:
         raise self.retry(exc=e)
 
 
-@app.task(bind=True, max_retries=3, default_retry_delay=600)  # Longer delay for content generation
+@app.task(bind=True, max_retries=3, default_retry_delay=300)
+def process_raw_data_batch_task(self, raw_data_ids: list[int]) -> None:
+    """Task to parse a batch of raw data records with batched LLM extraction calls."""
+    if not raw_data_ids:  # Nothing new from the upstream scrape in the chain
+        return
+    logger.info(f"Task: Processing {len(raw_data_ids)} raw data records in a batch")
+    try:
+        structured_fact_ids = _agent('data_ingestion').process_raw_data_batch(raw_data_ids)
+        created = [fact_id for fact_id in structured_fact_ids if fact_id]
+        logger.info(f"Structured facts created: {created}. Ready for content generation.")
+    except Exception as e:
+        logger.error(f"Processing raw data batch task failed for IDs {raw_data_ids}: {e}")
+        raise self.retry(exc=e)
+
+
+@app.task(bind=True, max_retries=3, default_retry_delay=600, rate_limit="5/s")  # Longer delay for content generation
 def generate_content_pipeline_task(self, structured_fact_id: int, language: str,
                                    keywords: list[str] | None = None) -> None:
     """
@@ -68,51 +135,102 @@ def generate_content_pipeline_task(self, structured_fact_id: int, language: str,
     logger.info(f"Task: Starting content generation pipeline for structured fact ID {structured_fact_id} in {language}")
     try:
         # 1. Generate Article
-        generated_content_id = content_generation_agent.generate_article(structured_fact_id, language, keywords)
+        generated_content_id = _agent('content_generation').generate_article(structured_fact_id, language, keywords)
         if not generated_content_id:
             logger.warning(f"Skipping pipeline for {structured_fact_id} as article generation failed or was duplicate.")
             return
 
+        _run_post_generation_steps([generated_content_id])
+
+    except Exception as e:
+        logger.error(f"Content generation pipeline failed for structured fact ID {structured_fact_id}: {e}")
+        raise self.retry(exc=e)
+
+
+@app.task(bind=True, max_retries=3, default_retry_delay=600)
+def generate_content_batch_pipeline_task(self, jobs: list[tuple[int, str, list[str] | None]]) -> list[int]:
+    """
+    First stage of the batched content pipeline: articles for all (structured_fact_id, language, keywords)
+    jobs are generated with batched LLM calls. Returns the new GeneratedContent IDs.
+    Enqueue as `chain(generate_content_batch_pipeline_task.s(jobs), post_generation_steps_task.s())`.
+    """
+    logger.info(f"Task: Starting batched content generation pipeline for {len(jobs)} structured facts")
+    try:
+        with llm_deadline(CONTENT_GENERATION_LLM_DEADLINE_SECONDS):
+            generated_content_ids = _agent('content_generation').generate_articles_batch(jobs)
+        for (structured_fact_id, _, _), generated_content_id in zip(jobs, generated_content_ids):
+            if not generated_content_id:
+                logger.warning(
+                    f"Skipping pipeline for {structured_fact_id} as article generation failed or was duplicate.")
+        return [content_id for content_id in generated_content_ids if content_id]
+    except Exception as e:
+        logger.error(f"Batched content generation pipeline failed: {e}")
+        raise self.retry(exc=e)
+
+
+@app.task(bind=True, max_retries=3, default_retry_delay=600)
+def post_generation_steps_task(self, generated_content_ids: list[int]) -> None:
+    """
+    Second stage of the batched content pipeline (images -> video -> monetization -> SEO -> publish).
+    A separate task so its retries don't regenerate the articles of the first stage.
+    """
+    if not generated_content_ids:
+        return
+    logger.info(f"Task: Running post-generation steps for {len(generated_content_ids)} content items")
+    try:
+        _run_post_generation_steps(generated_content_ids)
+    except Exception as e:
+        logger.error(f"Post-generation steps failed for content IDs {generated_content_ids}: {e}")
+        raise self.retry(exc=e)
+
+
+def _run_post_generation_steps(generated_content_ids: list[int]) -> None:
+    """
+    Runs the pipeline steps that follow article generation: images -> video -> monetization -> SEO -> publish.
+    Monetization, SEO and WordPress publishing each run once across all the given content items (batched or
+    fanned out concurrently) rather than item by item.
+    """
+    video_paths = {}
+    for generated_content_id in generated_content_ids:
         # 2. Generate Images
-        image_paths = content_generation_agent.generate_images_for_content(generated_content_id)
+        image_paths = _agent('content_generation').generate_images_for_content(generated_content_id)
         if not image_paths:
             logger.warning(f"No images generated for content ID {generated_content_id}.")
 
         # 3. Generate Video (Optional, if video is part of strategy)
-        video_path = content_generation_agent.generate_video_for_content(generated_content_id)
+        video_path = _agent('content_generation').generate_video_for_content(generated_content_id)
         if video_path:
             logger.info(f"Video generated for content ID {generated_content_id} at {video_path}")
         else:
             logger.warning(f"No video generated for content ID {generated_content_id}.")
+        video_paths[generated_content_id] = video_path
 
-        # 4. Inject Monetization
-        monetization_feedback_agent.inject_monetization(generated_content_id)
+    # 4. Inject Monetization (per-article LLM calls fanned out concurrently)
+    _agent('monetization_feedback').inject_monetization_batch(generated_content_ids)
 
-        # 5. Optimize SEO
-        seo_data = seo_distribution_agent.optimize_content_seo(generated_content_id)
+    # 5. Optimize SEO (articles are marshalled into batched LLM prompts)
+    seo_results = _agent('seo_distribution').optimize_seo_batch(generated_content_ids)
+    for generated_content_id, seo_data in zip(generated_content_ids, seo_results):
         if not seo_data:
             logger.warning(f"SEO optimization failed for content ID {generated_content_id}.")
 
-        # 6. Publish to Platforms
-        wordpress_url = seo_distribution_agent.publish_to_wordpress(generated_content_id)
+    # 6. Publish to Platforms
+    wordpress_urls = _agent('seo_distribution').publish_batch(generated_content_ids)
+    for generated_content_id, wordpress_url in zip(generated_content_ids, wordpress_urls):
         if wordpress_url:
             logger.info(f"Content {generated_content_id} published to WordPress: {wordpress_url}")
         else:
             logger.error(f"Failed to publish content {generated_content_id} to WordPress.")
 
-        if video_path:  # Only attempt YouTube publish if video was actually generated
-            youtube_url = seo_distribution_agent.publish_to_youtube(generated_content_id)
+        if video_paths[generated_content_id]:  # Only attempt YouTube publish if video was actually generated
+            youtube_url = _agent('seo_distribution').publish_to_youtube(generated_content_id)
             if youtube_url:
                 logger.info(f"Content {generated_content_id} published to YouTube: {youtube_url}")
             else:
                 logger.error(f"Failed to publish video {generated_content_id} to YouTube.")
 
-        # You can add more publishing platforms here (Twitter, Facebook, etc.)
-        # e.g., seo_distribution_agent.publish_to_twitter(generated_content_id)
-
-    except Exception as e:
-        logger.error(f"Content generation pipeline failed for structured fact ID {structured_fact_id}: {e}")
-        raise self.retry(exc=e)
+    # You can add more publishing platforms here (Twitter, Facebook, etc.)
+    # e.g., _agent('seo_distribution').publish_to_twitter(generated_content_id)
 
 
 @app.task(bind=True, max_retries=3, default_retry_delay=3600)  # Retry after 1 hour
@@ -120,8 +238,8 @@ def collect_and_analyze_metrics_task(self) -> None:
     """Task to collect performance metrics and analyze for optimization."""
     logger.info("Task: Collecting and analyzing performance metrics.")
     try:
-        monetization_feedback_agent.collect_performance_metrics()
-        monetization_feedback_agent.analyze_and_optimize()
+        _agent('monetization_feedback').collect_performance_metrics()
+        _agent('monetization_feedback').analyze_and_optimize()
     except Exception as e:
         logger.error(f"Metrics collection/analysis task failed: {e}")
         raise self.retry(exc=e)
@@ -129,10 +247,15 @@ def collect_and_analyze_metrics_task(self) -> None:
 
 # --- Orchestrator Scheduling (Celery Beat Configuration) ---
 # This dictionary defines how often tasks run. Celery Beat process uses this.
+_SCHEDULE_DAILY_2AM = crontab(hour=2, minute=0)
+_SCHEDULE_DAILY_4_30AM = crontab(hour=4, minute=30)
+_SCHEDULE_3H = timedelta(hours=3)
+_SCHEDULE_1H = timedelta(hours=1)
+app.conf.beat_max_loop_interval = 60  # Seconds between Beat wake-ups at most (default is 300)
 app.conf.beat_schedule = {
     'scrape-new-data-sources-daily': {
         'task': 'orchestrator.main_orchestrator.discover_and_queue_scrape_targets_task',
-        'schedule': crontab(hour=2, minute=0),  # Every day at 2:00 AM IST
+        'schedule': _SCHEDULE_DAILY_2AM,  # Every day at 2:00 AM IST
         'args': ([  # Initial seed URLs for scraping
                      {"url": "https://agri.rajasthan.gov.in/content/agriculture/en/schemes.html",
                       "selectors": {"scheme_name": ".scheme-title", "scheme_details": ".scheme-description"}},
@@ -146,15 +269,15 @@ app.conf.beat_schedule = {
     },
     'process-unparsed-data-every-3-hours': {
         'task': 'orchestrator.main_orchestrator.process_all_unparsed_data_task',
-        'schedule': timedelta(hours=3),
+        'schedule': _SCHEDULE_3H,
     },
     'trigger-content-generation-hourly': {
         'task': 'orchestrator.main_orchestrator.trigger_content_generation_task',
-        'schedule': timedelta(hours=1),  # Attempt to generate new content every hour
+        'schedule': _SCHEDULE_1H,  # Attempt to generate new content every hour
     },
     'collect-and-analyze-metrics-daily': {
         'task': 'orchestrator.main_orchestrator.collect_and_analyze_metrics_task',
-        'schedule': crontab(hour=4, minute=30),  # Every day at 4:30 AM IST
+        'schedule': _SCHEDULE_DAILY_4_30AM,  # Every day at 4:30 AM IST
     },
 }
 
@@ -178,23 +301,32 @@ def discover_and_queue_scrape_targets_task(initial_urls: list[dict]) -> None:
 
     # For this blueprint, we'll just re-queue the initial URLs to ensure continuous data flow.
     # In a real scenario, you'd have logic to find *new* URLs dynamically.
-    for target in initial_urls:
-        scrape_url_task.delay(target["url"])  # No specific selectors needed here, scraper will try to extract broadly
-        time.sleep(random.uniform(0.5, 2.0))  # Introduce random delay
+    # Known URLs are filtered with one query before queueing, so no task is queued for nothing
+    target_urls = [target["url"] for target in initial_urls]
+    existing = get_db_manager().existing_urls(target_urls)
+    new_urls = [url for url in target_urls if url not in existing]
+    if not new_urls:
+        logger.info("All discovered URLs already exist in raw data. Nothing to queue.")
+        return
+    # Scraped concurrently in one task, then parsed in batches by the chained task on any free worker.
+    # No specific selectors needed here, scraper will try to extract broadly
+    chain(scrape_urls_batch_task.s(new_urls), process_raw_data_batch_task.s()).apply_async()
 
 
 @app.task
 def process_all_unparsed_data_task() -> None:
     """Processes all raw data records that are in 'NEW' status."""
     logger.info("Task: Processing all unprocessed raw data records.")
-    unprocessed_records = db_manager.get_unprocessed_raw_data(limit=50)  # Process a batch
+    unprocessed_records = get_db_manager().claim_unprocessed_raw_data(limit=50)  # Claim a batch (no double processing)
     if not unprocessed_records:
         logger.info("No new raw data records to process.")
         return
 
-    for record in unprocessed_records:
-        process_raw_data_task.delay(record.id)
-        time.sleep(random.uniform(0.1, 0.5))  # Small delay between tasks
+    # Queue records in groups so each worker task can batch its LLM extraction calls.
+    # Published as one Celery group; LLM pacing is enforced by the API rate limiters, not by sleeping here.
+    record_ids = [record.id for record in unprocessed_records]
+    group(process_raw_data_batch_task.s(record_ids[batch_start:batch_start + LLM_BATCH_SIZE])
+          for batch_start in range(0, len(record_ids), LLM_BATCH_SIZE)).apply_async()
 
 
 @app.task
@@ -204,13 +336,27 @@ def trigger_content_generation_task() -> None:
     Prioritizes facts not yet processed for content.
     """
     logger.info("Task: Triggering content generation pipeline for available structured facts.")
-    structured_facts = db_manager.get_structured_data_for_generation(
-        limit=CONTENT_VOLUME_PER_DAY)  # Get a batch for daily volume
+    # Keyset cursor: continue after the last fact queued by the previous run
+    try:
+        after_id = int(state_store.get(CONTENT_GENERATION_CURSOR_KEY) or 0)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read the content generation cursor: {e}. Starting from the oldest fact.")
+        after_id = 0
+    structured_facts = get_db_manager().claim_structured_data_for_generation(
+        limit=CONTENT_VOLUME_PER_DAY, after_id=after_id)  # Claim a batch for daily volume (no double processing)
+
+    # A short page means the backlog end was reached: wrap around so facts that failed generation are retried
+    next_after_id = structured_facts[-1].id if len(structured_facts) == CONTENT_VOLUME_PER_DAY else 0
+    try:
+        state_store.set(CONTENT_GENERATION_CURSOR_KEY, next_after_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not save the content generation cursor: {e}")
 
     if not structured_facts:
         logger.info("No new structured facts available for content generation.")
         return
 
+    jobs = []
     for fact in structured_facts:
         # Determine target language and keywords.
         # For blueprint, use the language from the structured fact, and generic keywords.
@@ -221,6 +367,11 @@ def trigger_content_generation_task() -> None:
         keywords = [NICHE_TOPIC, fact.data.get("pump_model", ""), fact.data.get("gov_schemes", [{}])[0].get("name", "")]
         keywords = [k for k in keywords if k]  # Remove empty strings
 
-        generate_content_pipeline_task.delay(fact.id, target_lang, keywords)
-        time.sleep(random.uniform(1, 5))  # Introduce random delay to space out LLM calls
+        jobs.append((fact.id, target_lang, keywords))
+
+    # Queue facts in groups so each worker task can batch its article generation LLM calls.
+    # Published as one Celery group; LLM pacing is enforced by the API rate limiters, not by sleeping here.
+    group(chain(generate_content_batch_pipeline_task.s(jobs[batch_start:batch_start + LLM_BATCH_SIZE]),
+                post_generation_steps_task.s())
+          for batch_start in range(0, len(jobs), LLM_BATCH_SIZE)).apply_async()
 
@@ -0,0 +1,67 @@
+# utils/bloom.py
+import hashlib
+import math
+import os
+import struct
+import threading
+
+_HEADER = struct.Struct("<8sQQQ")  # magic, number of bits, number of hash functions, user watermark
+_MAGIC = b"ALCHBF01"
+
+
+class BloomFilter:
+    """
+    Compact, thread-safe Bloom filter for string keys.
+    `key in bloom` is False only for keys that were never added; True may be a false positive
+    (at roughly `error_rate` once `capacity` keys are added), so positives must be confirmed elsewhere.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.watermark = 0  # Caller-defined progress marker persisted with the filter (e.g. last row ID added)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from two 64-bit halves of one SHA-256 digest
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        h1, h2 = struct.unpack_from("<QQ", digest)
+        h2 |= 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key: str) -> None:
+        positions = self._positions(key)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def save(self, path: str) -> None:
+        """Writes the filter atomically (temp file + rename), so concurrent readers never see a partial file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self._lock, open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.num_bits, self.num_hashes, self.watermark))
+            f.write(self._bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, capacity: int, error_rate: float) -> "BloomFilter | None":
+        """Loads a filter saved by `save`. Returns None if the file is missing, corrupt or sized differently."""
+        bloom = cls(capacity, error_rate)
+        try:
+            with open(path, "rb") as f:
+                magic, num_bits, num_hashes, watermark = _HEADER.unpack(f.read(_HEADER.size))
+                bits = f.read()
+        except (OSError, struct.error):
+            return None
+        if magic != _MAGIC or (num_bits, num_hashes) != (bloom.num_bits, bloom.num_hashes) \
+                or len(bits) != len(bloom._bits):
+            return None
+        bloom._bits[:] = bits
+        bloom.watermark = watermark
+        return bloom
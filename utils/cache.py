@@ -0,0 +1,324 @@
+# utils/cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import redis
+from config.settings import EMBEDDING_CACHE_MAX_ENTRIES, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, \
+    HASH_SEEN_CACHE_MAX_ENTRIES, HASH_SEEN_CACHE_REDIS_URL, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_STATS_LOG_INTERVAL
+from utils.logger import setup_logger
+
+logger = setup_logger("Cache")
+
+
+class LRUCache:
+    """
+    Small thread-safe, size-bounded LRU mapping.
+    The least recently used entry is evicted once `maxsize` is exceeded.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key` (marking it as recently used), or `default`."""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value) -> None:
+        """Stores `value` under `key`, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def quantize_int8(embedding) -> tuple[float, bytes]:
+    """
+    Symmetric int8 quantization with one scale per vector (the largest |component| maps to 127).
+    Cosine similarity is preserved to well under the dedup thresholds, at a quarter of float32's size.
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return scale, np.round(vector / np.float32(scale)).astype(np.int8).tobytes()
+
+
+def dequantize_int8(scale: float, data: bytes) -> np.ndarray:
+    """Inverse of `quantize_int8`, as a float32 vector."""
+    return np.frombuffer(data, dtype=np.int8).astype(np.float32) * np.float32(scale)
+
+
+def embedding_hash(embedding) -> str:
+    """
+    SHA-256 hex digest of an embedding's int8-quantized components (scale excluded).
+    A full-precision vector and its quantized round-trip from EmbeddingStore hash the same, so the
+    hash is stable whichever cache tier served the embedding.
+    """
+    return hashlib.sha256(quantize_int8(embedding)[1]).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Persistent SQLite store of embedding vectors, shared by all worker processes on a host.
+    Embeddings are deterministic for a model and input, so entries never expire. Vectors are stored
+    int8-quantized with a per-vector scale (see quantize_int8), one byte per dimension.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily and per process, like LLMCache
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings_int8 "
+                               "(key BLOB PRIMARY KEY, scale REAL NOT NULL, vector BLOB NOT NULL)")
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        """Returns the stored (dequantized) vectors for whichever of `keys` are present."""
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = keys[start:start + 500]
+                rows += self._connection().execute(
+                    f"SELECT key, scale, vector FROM embeddings_int8 WHERE key IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+        return {key: dequantize_int8(scale, vector).tolist() for key, scale, vector in rows}
+
+    def put_many(self, items: dict[bytes, tuple[float, bytes]]) -> None:
+        """Stores the quantized vectors in `items` (key -> `quantize_int8` result)."""
+        if not items:
+            return
+        with self._lock:
+            self._connection().executemany(
+                "INSERT OR REPLACE INTO embeddings_int8 (key, scale, vector) VALUES (?, ?, ?)",
+                [(key, scale, data) for key, (scale, data) in items.items()]
+            )
+
+
+class CachedEmbedder:
+    """
+    Memoizes LLMInterface.embed_text in a bounded in-process LRU backed by a persistent EmbeddingStore.
+    Entries are keyed by SHA-256 of the model choice, embedding model and input text, so identical inputs
+    (task retries, overlapping pages, re-ingestion after a restart) don't re-hit the embedding API.
+    Store errors degrade to the in-process tier only.
+    """
+
+    def __init__(self, llm_interface, maxsize: int = EMBEDDING_CACHE_MAX_ENTRIES, store: EmbeddingStore | None = None):
+        self.llm_interface = llm_interface
+        self._cache = LRUCache(maxsize)
+        self._store = store if store is not None else EmbeddingStore()
+        self._stats = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+        self._lookups = 0
+
+    def _cache_key(self, text: str, model_choice: str) -> bytes:
+        model_name = self.llm_interface.embedding_models.get(model_choice, "")
+        return hashlib.sha256(f"{model_choice}\0{model_name}\0{text}".encode("utf-8")).digest()
+
+    def _record_stats(self, memory_hits: int, store_hits: int, misses: int) -> None:
+        """Accumulates hit/miss counts and logs them (debug) every EMBEDDING_CACHE_STATS_LOG_INTERVAL lookups."""
+        with self._stats_lock:
+            self._stats["memory_hits"] += memory_hits
+            self._stats["store_hits"] += store_hits
+            self._stats["misses"] += misses
+            previous_lookups = self._lookups
+            self._lookups += memory_hits + store_hits + misses
+            should_log = previous_lookups // EMBEDDING_CACHE_STATS_LOG_INTERVAL != \
+                self._lookups // EMBEDDING_CACHE_STATS_LOG_INTERVAL
+            stats = dict(self._stats)
+        if should_log:
+            logger.debug(f"Embedding cache after {self._lookups} lookups: {stats}")
+
+    def embed_text(self, text: str, model_choice: str = "gemini") -> list[float] | None:
+        """Same contract as LLMInterface.embed_text, served from cache when possible."""
+        return self.embed_text_many([text], model_choice=model_choice)[0]
+
+    def embed_text_many(self, texts: list[str], model_choice: str = "gemini") -> list[list[float] | None]:
+        """
+        Embeds several texts, in order. The LRU and then the persistent store are checked in bulk;
+        only texts missing from both reach the embedding API. Failed embeddings are None.
+        """
+        keys = [self._cache_key(text, model_choice) for text in texts]
+        results = [None] * len(texts)
+        missing = {}  # key -> input indexes still to resolve
+        for i, key in enumerate(keys):
+            cached = self._cache.get(key)
+            if cached is not None:
+                results[i] = list(cached)
+            else:
+                missing.setdefault(key, []).append(i)
+        if not missing:
+            self._record_stats(len(texts), 0, 0)
+            return results
+
+        try:
+            stored = self._store.get_many(list(missing))
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store read failed ({e}). Calling the embedding API directly.")
+            stored = {}
+
+        # Texts in neither tier go to the embedding API together
+        to_embed = [key for key in missing if key not in stored]
+        computed = {}
+        if len(to_embed) == 1:
+            embedding = self.llm_interface.embed_text(texts[missing[to_embed[0]][0]], model_choice=model_choice)
+            if embedding is not None:
+                computed[to_embed[0]] = embedding
+        elif to_embed:
+            matrix = self.llm_interface.embed_text_batch([texts[missing[key][0]] for key in to_embed],
+                                                         model_choice=model_choice)
+            failed = np.isnan(matrix).any(axis=1)
+            computed = {key: row.tolist() for key, row, row_failed in zip(to_embed, matrix, failed) if not row_failed}
+
+        # New embeddings are returned at full precision; only the persistent store keeps them quantized
+        quantized = {key: quantize_int8(embedding) for key, embedding in computed.items()}
+
+        for key, indexes in missing.items():
+            embedding = stored[key] if key in stored else computed.get(key)
+            if embedding is None:
+                continue
+            self._cache.put(key, tuple(embedding))  # Immutable copy so callers can't mutate the cached vector
+            for i in indexes:
+                results[i] = list(embedding)
+
+        try:
+            self._store.put_many(quantized)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding store write failed: {e}")
+        # Repeats of a text within the batch count as memory hits: they are served by the same lookup
+        self._record_stats(len(texts) - len(missing), len(stored), len(missing) - len(stored))
+        return results
+
+
+class HashSeenCache:
+    """
+    Two-tier memo of keys known to exist in the database (URLs, content hashes, embedding hashes).
+    Rows are never deleted, so "exists" answers stay true and are the only ones cached: a process-local
+    LRU in front of a Redis set shared by all workers. Unknown keys fall through to the DB query.
+    Redis errors degrade to the local tier only.
+    """
+
+    def __init__(self, name: str, maxsize: int = HASH_SEEN_CACHE_MAX_ENTRIES,
+                 redis_url: str | None = HASH_SEEN_CACHE_REDIS_URL):
+        self._redis_key = f"seen:{name}"
+        self._local = LRUCache(maxsize)
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=1,
+                                           socket_connect_timeout=1) if redis_url else None
+
+    def filter_seen(self, keys) -> set:
+        """Returns the subset of `keys` known to exist (local LRU, then one pipelined Redis round-trip)."""
+        seen = {key for key in keys if self._local.get(key)}
+        unknown = [key for key in set(keys) if key not in seen]
+        if unknown and self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for key in unknown:
+                    pipe.sismember(self._redis_key, key)
+                redis_hits = {key for key, is_member in zip(unknown, pipe.execute()) if is_member}
+            except redis.RedisError as e:
+                logger.warning(f"Hash seen cache lookup failed ({self._redis_key}): {e}")
+                redis_hits = set()
+            for key in redis_hits:
+                self._local.put(key, True)
+            seen |= redis_hits
+        return seen
+
+    def add(self, keys) -> None:
+        """Records `keys` as existing in both tiers."""
+        keys = [key for key in keys if key]
+        if not keys:
+            return
+        for key in keys:
+            self._local.put(key, True)
+        if self._redis is not None:
+            try:
+                self._redis.sadd(self._redis_key, *keys)
+            except redis.RedisError as e:
+                logger.warning(f"Hash seen cache update failed ({self._redis_key}): {e}")
+
+
+class LLMCache:
+    """
+    Persistent SQLite cache for deterministic LLM responses, shared by all worker processes on a host.
+    Entries expire after `ttl_seconds`. Keys are built with `make_key` from the inputs that determine the response.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._conn = None
+        self._conn_pid = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """SHA-256 over the NUL-separated key parts (e.g. model, prompt inputs)."""
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily and per process: SQLite connections must not be shared across a fork (Celery prefork)
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")  # Concurrent readers alongside a writer
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached response for `key`, or None if missing or expired."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: str) -> None:
+        """Stores `value` under `key` for `ttl_seconds`."""
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds)
+            )
+
+    def generate_text(self, llm_interface, cache_key: str, prompt: str, **generation_kwargs) -> str | None:
+        """
+        LLMInterface.generate_text served from the cache when possible.
+        Only successful (non-empty) responses are cached. Cache errors fall through to the LLM.
+        """
+        try:
+            cached = self.get(cache_key)
+            if cached is not None:
+                return cached
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed ({e}). Calling the LLM directly.")
+
+        response = llm_interface.generate_text(prompt, **generation_kwargs)
+        if response:
+            try:
+                self.put(cache_key, response)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {e}")
+        return response
@@ -0,0 +1,31 @@
+# utils/chunker.py
+import hashlib
+import zlib
+from config.settings import CONTENT_CHUNK_BOUNDARY_MODULUS
+
+
+def chunk_text(text: str, boundary_modulus: int = CONTENT_CHUNK_BOUNDARY_MODULUS) -> list[str]:
+    """
+    Splits text into content-defined chunks of whole lines.
+    A chunk ends after any line whose CRC32 is divisible by `boundary_modulus`, so boundaries depend
+    only on local content: an edit changes the chunk it falls in, not every chunk after it.
+    Blank lines and surrounding whitespace are ignored.
+    """
+    chunks = []
+    current_lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        current_lines.append(line)
+        if zlib.crc32(line.encode("utf-8")) % boundary_modulus == 0:
+            chunks.append("\n".join(current_lines))
+            current_lines = []
+    if current_lines:
+        chunks.append("\n".join(current_lines))
+    return chunks
+
+
+def chunk_hashes(text: str, boundary_modulus: int = CONTENT_CHUNK_BOUNDARY_MODULUS) -> list[str]:
+    """Returns the SHA-256 hex digest of each content-defined chunk of `text`, in order."""
+    return [hashlib.sha256(chunk.encode("utf-8")).hexdigest() for chunk in chunk_text(text, boundary_modulus)]
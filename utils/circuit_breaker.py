@@ -0,0 +1,48 @@
+# utils/circuit_breaker.py
+import threading
+import time
+from utils.logger import setup_logger
+
+logger = setup_logger("CircuitBreaker")
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for an external provider.
+    After `fail_max` consecutive failures the circuit opens and `allow` returns False for `reset_timeout`
+    seconds, so callers fail fast instead of waiting on a degraded provider. After that, one trial call is
+    let through per `reset_timeout` (half-open); a success closes the circuit again.
+    """
+
+    def __init__(self, name: str, fail_max: int, reset_timeout: float):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now."""
+        with self._lock:
+            if self._failures < self.fail_max:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:
+                self._opened_at = now  # Half-open: this caller makes the trial call, others keep failing fast
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._failures >= self.fail_max:
+                logger.info(f"Circuit for {self.name} closed again.")
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.fail_max:
+                if self._failures == self.fail_max:
+                    logger.warning(f"Circuit for {self.name} opened after {self.fail_max} consecutive failures.")
+                self._opened_at = time.monotonic()
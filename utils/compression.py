@@ -0,0 +1,23 @@
+# utils/compression.py
+import threading
+import zstandard
+from config.settings import RAW_HTML_ZSTD_LEVEL
+
+# zstd (de)compressor objects are reusable but not safe for concurrent use, so each thread keeps its own
+_local = threading.local()
+
+
+def zstd_compress(data: bytes) -> bytes:
+    """Compresses `data` into a single zstd frame (with the content size in the header)."""
+    compressor = getattr(_local, "compressor", None)
+    if compressor is None:
+        compressor = _local.compressor = zstandard.ZstdCompressor(level=RAW_HTML_ZSTD_LEVEL)
+    return compressor.compress(data)
+
+
+def zstd_decompress(data: bytes) -> bytes:
+    """Decompresses a zstd frame produced by `zstd_compress`."""
+    decompressor = getattr(_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor.decompress(data)
@@ -1,12 +1,29 @@
 # utils/file_manager.py
 import os
-import json
+import orjson  # Fast C JSON parsing/serialization
 from config.settings import DATA_DIR
 
 
-def _ensure_directory(directory: str):
-    """Ensures that a directory exists."""
+_ensured_directories: set[str] = set()  # Directories already created/checked by this process
+
+
+def ensure_directory(directory: str):
+    """Ensures that a directory exists. The makedirs syscalls are only issued once per process per directory."""
+    if directory in _ensured_directories:
+        return
     os.makedirs(directory, exist_ok=True)
+    _ensured_directories.add(directory)
+
+
+def _write_bytes(filepath: str, data: bytes) -> None:
+    """Writes `data` with unbuffered os-level writes (no Python buffered-writer layer in between)."""
+    fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]  # os.write may write less than asked
+    finally:
+        os.close(fd)
 
 
 def save_content_file(content: str | bytes, filename: str, directory: str, binary_mode: bool = False) -> str:
@@ -15,14 +32,10 @@ def save_content_file(content: str | bytes, filename: str, directory: str, binar
     Returns the full path to the saved file.
     """
     full_directory_path = os.path.join(DATA_DIR, directory)
-    _ensure_directory(full_directory_path)
+    ensure_directory(full_directory_path)
     filepath = os.path.join(full_directory_path, filename)
 
-    mode = "wb" if binary_mode else "w"
-    encoding = None if binary_mode else "utf-8"
-
-    with open(filepath, mode, encoding=encoding) as f:
-        f.write(content)
+    _write_bytes(filepath, content if binary_mode else content.encode("utf-8"))
     return filepath
 
 
@@ -37,16 +50,16 @@ def load_content_file(filepath: str, binary_mode: bool = False) -> str | bytes:
         return f.read()
 
 
-def save_json(data: dict, filename: str, directory: str) -> str:
+def save_json(data: dict, filename: str, directory: str, indent: bool = False) -> str:
     """
-    Saves a dictionary as a JSON file.
+    Saves a dictionary as a (UTF-8) JSON file, compact unless `indent` is set (e.g. for debugging output).
     Returns the full path to the saved file.
     """
     full_directory_path = os.path.join(DATA_DIR, directory)
-    _ensure_directory(full_directory_path)
+    ensure_directory(full_directory_path)
     filepath = os.path.join(full_directory_path, filename)
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    _write_bytes(filepath, orjson.dumps(data, option=option))
     return filepath
 
 
@@ -54,5 +67,5 @@ def load_json(filepath: str) -> dict:
     """
     Loads a JSON file into a dictionary.
     """
-    with open(filepath, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(filepath, "rb") as f:
+        return orjson.loads(f.read())
@@ -0,0 +1,21 @@
+# utils/http_session.py
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Retry policy for third-party APIs: connection errors, and throttling/gateway errors on idempotent methods
+# (urllib3 does not retry POSTs on a status code), with exponential backoff.
+API_RETRY_POLICY = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504])
+
+
+def create_session(pool_maxsize: int = 10, max_retries: Retry | int = 0) -> requests.Session:
+    """
+    Creates a requests.Session whose connection pool keeps up to `pool_maxsize` keep-alive
+    connections per host, so concurrent callers reuse TCP/TLS connections instead of
+    opening (and discarding) a new one per request.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, max_retries=max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
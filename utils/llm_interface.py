@@ -1,97 +1,508 @@
 # utils/llm_interface.py
-from google.generativeai import GenerativeModel, configure
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
+import httpx
+import numpy as np
+import orjson
+from google.generativeai import GenerativeModel, configure, embed_content
+from google.api_core import exceptions as google_exceptions
+import openai
 from openai import OpenAI
-from config.settings import GEMINI_API_KEY, OPENAI_API_KEY, TEXT_GENERATION_MODEL
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
+from config.settings import GEMINI_API_KEY, OPENAI_API_KEY, TEXT_GENERATION_MODEL, LLM_BATCH_MAX_CONCURRENCY, \
+    LLM_BATCH_MAX_CONCURRENCY_BY_PROVIDER, EMBEDDING_DIM, EMBEDDING_BATCH_MAX_INPUTS, LLM_MAX_ATTEMPTS, \
+    LLM_CONTEXT_WINDOW_TOKENS, LLM_CIRCUIT_FAIL_MAX, LLM_CIRCUIT_RESET_SECONDS, LLM_FAILOVER_ENABLED
+from utils.circuit_breaker import CircuitBreaker
 from utils.logger import setup_logger
+from utils.rate_limiter import gemini_limiter, openai_limiter, gemini_token_limiter, openai_token_limiter, \
+    estimate_tokens
 
 logger = setup_logger("LLM_Interface")
 
+# Request and token limiters per provider; each provider uses a single text model and a single embedding model
+_LIMITERS = {
+    "gemini": (gemini_limiter, gemini_token_limiter),
+    "openai": (openai_limiter, openai_token_limiter),
+}
+
+
+# Per-provider circuit breakers, tripped by transient failures that outlast the retries
+_BREAKERS = {
+    provider: CircuitBreaker(provider, LLM_CIRCUIT_FAIL_MAX, LLM_CIRCUIT_RESET_SECONDS) for provider in _LIMITERS
+}
+_FAILOVER_PROVIDER = {"gemini": "openai", "openai": "gemini"}
+
+
+def _record_outcome(model_choice: str, error: Exception | None = None) -> None:
+    """Reports a call's outcome to the provider's circuit breaker. Only transient errors count as failures."""
+    breaker = _BREAKERS[model_choice]
+    if error is None:
+        breaker.record_success()
+    elif isinstance(error, _TRANSIENT_ERRORS):
+        breaker.record_failure()  # Request-specific errors (bad request, safety block) don't count
+
+
+def _circuit_open(model_choice: str, action: str) -> bool:
+    """Whether the provider's circuit is open, so `action` should be skipped (logged)."""
+    if _BREAKERS[model_choice].allow():
+        return False
+    logger.warning(f"Circuit for {model_choice} is open. Skipping {action}.")
+    return True
+
+
+def _throttle(model_choice: str, tokens: int) -> None:
+    """Blocks until the provider's request and token budgets allow one more call of `tokens` tokens."""
+    request_limiter, token_limiter = _LIMITERS[model_choice]
+    request_limiter.acquire()
+    token_limiter.acquire(tokens)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` to about `max_tokens` tokens (by the same estimate the token limiters use)."""
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars]
+
+
+def _output_budget(prompt: str, max_tokens: int, model_choice: str) -> int | None:
+    """
+    `max_tokens` reduced so prompt + output fit the model's context window, or None if the prompt alone
+    doesn't fit (the request would be rejected after a full upload, and retried for nothing).
+    """
+    window = LLM_CONTEXT_WINDOW_TOKENS.get(model_choice)
+    prompt_tokens = estimate_tokens(prompt)
+    if window is None or prompt_tokens + max_tokens <= window:
+        return max_tokens
+    if prompt_tokens >= window:
+        logger.error(f"Prompt of ~{prompt_tokens} tokens exceeds the {model_choice} context window ({window}). Skipping.")
+        return None
+    logger.warning(f"Reducing max_tokens from {max_tokens} to {window - prompt_tokens} to fit the {model_choice} "
+                   f"context window.")
+    return window - prompt_tokens
+
+
+# Deadline (time.monotonic() value) for the LLM calls of the current thread, set by `llm_deadline`
+_deadline = threading.local()
+
+
+@contextmanager
+def llm_deadline(seconds: float):
+    """
+    Bounds every LLM call this thread makes inside the block (including retries and generate_batch
+    workers) to finish within `seconds`. In-flight requests time out at the deadline and later calls
+    return None without being sent, so a stage that ran over budget stops spending provider quota.
+    Nested deadlines can only shorten the enclosing one.
+    """
+    previous = getattr(_deadline, "at", None)
+    deadline_at = time.monotonic() + seconds
+    _deadline.at = deadline_at if previous is None else min(previous, deadline_at)
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+
+def _call_timeout(timeout_s: float | None) -> float | None:
+    """Request timeout for the next call: the lower of `timeout_s` and the time left before the deadline."""
+    deadline_at = getattr(_deadline, "at", None)
+    if deadline_at is None:
+        return timeout_s
+    remaining = deadline_at - time.monotonic()
+    return remaining if timeout_s is None else min(timeout_s, remaining)
+
+
+def _deadline_passed(retry_state) -> bool:
+    timeout = _call_timeout(None)
+    return timeout is not None and timeout <= 0
+
+
+# Transient provider errors (throttling, timeouts, 5xx) are retried with jittered exponential backoff
+# until the attempts run out or the deadline passes; anything else (bad request, auth, safety blocks)
+# fails immediately. Each attempt is throttled again.
+_TRANSIENT_ERRORS = (
+    openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError,
+    google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded, google_exceptions.InternalServerError,
+)
+_retry_transient = retry(
+    stop=stop_after_attempt(LLM_MAX_ATTEMPTS) | _deadline_passed,
+    wait=wait_random_exponential(multiplier=1, max=30),
+    retry=retry_if_exception_type(_TRANSIENT_ERRORS),
+    reraise=True,
+)
+
+
+class _GeminiProvider:
+    """Gemini text generation and embeddings: throttled, and retried on transient errors."""
+    name = "gemini"
+
+    def __init__(self, llm: "LLMInterface"):
+        self._llm = llm
+
+    @property
+    def available(self) -> bool:
+        return self._llm.gemini_model is not None
+
+    @_retry_transient
+    def generate(self, prompt: str, temperature: float, max_tokens: int, timeout_s: float | None = None) -> str:
+        _throttle(self.name, estimate_tokens(prompt) + max_tokens)
+        timeout = _call_timeout(timeout_s)
+        response = self._llm.gemini_model.generate_content(
+            prompt,
+            generation_config={"temperature": temperature, "max_output_tokens": max_tokens},
+            request_options={"timeout": max(timeout, 0.1)} if timeout is not None else None
+        )
+        return response.text
+
+    def stream(self, prompt: str, temperature: float, max_tokens: int,
+               timeout_s: float | None = None) -> Iterator[str]:
+        _throttle(self.name, estimate_tokens(prompt) + max_tokens)
+        timeout = _call_timeout(timeout_s)
+        response = self._llm.gemini_model.generate_content(
+            prompt,
+            generation_config={"temperature": temperature, "max_output_tokens": max_tokens},
+            stream=True,
+            request_options={"timeout": max(timeout, 0.1)} if timeout is not None else None
+        )
+        for chunk in response:
+            yield chunk.text
+
+    @_retry_transient
+    def embed(self, content: str | list[str]):
+        """Embeds one text (returns a vector) or a list of texts (returns a list of vectors)."""
+        texts = content if isinstance(content, list) else [content]
+        _throttle(self.name, sum(estimate_tokens(text) for text in texts))
+        # Same task type for single and batched calls, so a text gets the same (cacheable) vector either way
+        return embed_content(model=self._llm.embedding_models[self.name], content=content,
+                             task_type="RETRIEVAL_DOCUMENT")['embedding']
+
+
+class _OpenAIProvider:
+    """OpenAI chat completions and embeddings: throttled, and retried on transient errors."""
+    name = "openai"
+
+    def __init__(self, llm: "LLMInterface"):
+        self._llm = llm
+
+    @property
+    def available(self) -> bool:
+        return self._llm.openai_client is not None
+
+    @_retry_transient
+    def generate(self, prompt: str, temperature: float, max_tokens: int, timeout_s: float | None = None) -> str:
+        _throttle(self.name, estimate_tokens(prompt) + max_tokens)
+        timeout = _call_timeout(timeout_s)
+        response = self._llm.openai_client.chat.completions.create(
+            model=self._llm.openai_model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **({"timeout": max(timeout, 0.1)} if timeout is not None else {})
+        )
+        return response.choices[0].message.content
+
+    def stream(self, prompt: str, temperature: float, max_tokens: int,
+               timeout_s: float | None = None) -> Iterator[str]:
+        _throttle(self.name, estimate_tokens(prompt) + max_tokens)
+        timeout = _call_timeout(timeout_s)
+        stream = self._llm.openai_client.chat.completions.create(
+            model=self._llm.openai_model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **({"timeout": max(timeout, 0.1)} if timeout is not None else {})
+        )
+        with stream:  # Closes the HTTP response if the caller stops consuming early
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    @_retry_transient
+    def embed(self, content: str | list[str]):
+        """Embeds one text (returns a vector) or a list of texts (returns a list of vectors)."""
+        texts = content if isinstance(content, list) else [content]
+        _throttle(self.name, sum(estimate_tokens(text) for text in texts))
+        response = self._llm.openai_client.embeddings.create(
+            model=self._llm.embedding_models[self.name],
+            input=content,
+            dimensions=EMBEDDING_DIM  # Shortened to fit the pgvector column
+        )
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        return embeddings if isinstance(content, list) else embeddings[0]
+
 
 class LLMInterface:
     """
     Unified interface for interacting with various Large Language Models.
     Handles API configuration and basic error logging.
+    Provider clients are created on first use, so processes that never call a provider don't set it up.
     """
 
     def __init__(self):
-        self.gemini_model = None
-        self.openai_client = None
         self.openai_model = "gpt-4o"  # Default OpenAI model
+        # Embedding model per provider (also part of embedding cache keys, so changing one invalidates its entries)
+        self.embedding_models = {"gemini": "models/text-embedding-004", "openai": "text-embedding-3-small"}
+        # Provider registry: every call dispatches on model_choice through the same interface
+        self._providers = {provider.name: provider for provider in (_GeminiProvider(self), _OpenAIProvider(self))}
 
-        # Configure Gemini
-        if GEMINI_API_KEY:
-            try:
-                configure(api_key=GEMINI_API_KEY)
-                self.gemini_model = GenerativeModel(TEXT_GENERATION_MODEL)
-                logger.info(f"Gemini model '{TEXT_GENERATION_MODEL}' initialized.")
-            except Exception as e:
-                logger.error(f"Failed to configure Gemini API: {e}")
-                self.gemini_model = None
-        else:
+    def _provider(self, model_choice: str):
+        """The provider for `model_choice` if it is known and configured, else None."""
+        provider = self._providers.get(model_choice)
+        return provider if provider is not None and provider.available else None
+
+    @cached_property
+    def gemini_model(self) -> GenerativeModel | None:
+        """Gemini text model, configured on first access. None if Gemini is unavailable."""
+        if not GEMINI_API_KEY:
             logger.warning("GEMINI_API_KEY not found. Gemini will not be available.")
+            return None
+        try:
+            configure(api_key=GEMINI_API_KEY)
+            gemini_model = GenerativeModel(TEXT_GENERATION_MODEL)
+            logger.info(f"Gemini model '{TEXT_GENERATION_MODEL}' initialized.")
+            return gemini_model
+        except Exception as e:
+            logger.error(f"Failed to configure Gemini API: {e}")
+            return None
 
-        # Configure OpenAI
-        if OPENAI_API_KEY:
-            try:
-                self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-                logger.info(f"OpenAI client initialized with model '{self.openai_model}'.")
-            except Exception as e:
-                logger.error(f"Failed to configure OpenAI API: {e}")
-                self.openai_client = None
-        else:
+    @cached_property
+    def openai_client(self) -> OpenAI | None:
+        """OpenAI client, created on first access. None if OpenAI is unavailable."""
+        if not OPENAI_API_KEY:
             logger.warning("OPENAI_API_KEY not found. OpenAI will not be available.")
+            return None
+        try:
+            # One keep-alive HTTP/2 pool per process: concurrent batch requests are multiplexed as streams over
+            # a few connections instead of each paying a TCP + TLS handshake
+            http_client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+                timeout=httpx.Timeout(60.0, connect=5.0)
+            )
+            openai_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0,  # Retried by _retry_transient
+                                   http_client=http_client)
+            logger.info(f"OpenAI client initialized with model '{self.openai_model}'.")
+            return openai_client
+        except Exception as e:
+            logger.error(f"Failed to configure OpenAI API: {e}")
+            return None
 
     def generate_text(self, prompt: str, temperature: float = 0.7, max_tokens: int = 2000,
-                      model_choice: str = "gemini") -> str | None:
+                      model_choice: str = "gemini", timeout_s: float | None = None) -> str | None:
         """
         Generates text using the specified LLM.
+        The request is abandoned after `timeout_s` seconds or at the thread's `llm_deadline`, whichever is first.
+        While the provider's circuit is open, the other provider is used instead (LLM_FAILOVER_ENABLED).
         """
+        if _deadline_passed(None):
+            logger.warning(f"LLM deadline passed. Skipping {model_choice} generation.")
+            return None
+        model_choice = self._generation_provider(model_choice)
+        if model_choice is None:
+            return None
+        max_tokens = _output_budget(prompt, max_tokens, model_choice)
+        if max_tokens is None:
+            return None
+        provider = self._provider(model_choice)
         try:
-            if model_choice == "gemini" and self.gemini_model:
-                response = self.gemini_model.generate_content(
-                    prompt,
-                    generation_config={"temperature": temperature, "max_output_tokens": max_tokens}
-                )
-                return response.text
-            elif model_choice == "openai" and self.openai_client:
-                response = self.openai_client.chat.completions.create(
-                    model=self.openai_model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-                return response.choices[0].message.content
-            else:
-                logger.error(f"LLM model '{model_choice}' not configured or invalid choice.")
-                return None
+            text = provider.generate(prompt, temperature, max_tokens, timeout_s)
+            _record_outcome(model_choice)
+            return text
         except Exception as e:
+            _record_outcome(model_choice, e)
             logger.error(f"Error generating text with {model_choice}: {e}")
             return None
 
+    def _generation_provider(self, model_choice: str) -> str | None:
+        """
+        Provider to generate with: `model_choice`, or the other provider while its circuit is open
+        (LLM_FAILOVER_ENABLED). None if neither can be used right now.
+        """
+        if self._provider(model_choice) is None:
+            logger.error(f"LLM model '{model_choice}' not configured or invalid choice.")
+            return None
+        if _BREAKERS[model_choice].allow():
+            return model_choice
+        fallback = _FAILOVER_PROVIDER[model_choice]
+        if LLM_FAILOVER_ENABLED and self._provider(fallback) and _BREAKERS[fallback].allow():
+            logger.warning(f"Circuit for {model_choice} is open. Failing over to {fallback}.")
+            return fallback
+        logger.warning(f"Circuit for {model_choice} is open. Skipping generation.")
+        return None
+
+    def generate_text_stream(self, prompt: str, temperature: float = 0.7, max_tokens: int = 2000,
+                             model_choice: str = "gemini", timeout_s: float | None = None) -> Iterator[str]:
+        """
+        Streaming variant of `generate_text`: yields text fragments as the LLM produces them, so callers can
+        start post-processing (e.g. per section) before generation finishes. `"".join(...)` gives the full text.
+        Errors are logged and end the stream early; transient errors are not retried once output has started.
+        The request is bounded by `timeout_s` and the thread's `llm_deadline` like `generate_text`.
+        """
+        if _deadline_passed(None):
+            logger.warning(f"LLM deadline passed. Skipping {model_choice} streaming generation.")
+            return
+        model_choice = self._generation_provider(model_choice)
+        if model_choice is None:
+            return
+        max_tokens = _output_budget(prompt, max_tokens, model_choice)
+        if max_tokens is None:
+            return
+        provider = self._provider(model_choice)
+        try:
+            yield from provider.stream(prompt, temperature, max_tokens, timeout_s)
+            _record_outcome(model_choice)
+        except Exception as e:
+            _record_outcome(model_choice, e)
+            logger.error(f"Error streaming text with {model_choice}: {e}")
+
+    def generate_batch(self, prompts: list[str], temperature: float = 0.7, max_tokens: int = 2000,
+                       model_choice: str = "gemini", timeout_s: float | None = None) -> list[str | None]:
+        """
+        Generates text for several independent prompts at once.
+        Requests are multiplexed over a thread pool sized for the provider, so a batch costs roughly one
+        LLM round-trip. Returns results in the same order as `prompts`, with None for failed generations.
+        """
+        if not prompts:
+            return []
+
+        if len(prompts) == 1:
+            return [self.generate_text(prompts[0], temperature=temperature, max_tokens=max_tokens,
+                                       model_choice=model_choice, timeout_s=timeout_s)]
+
+        deadline_at = getattr(_deadline, "at", None)
+
+        def _generate(prompt: str) -> str | None:
+            _deadline.at = deadline_at  # Worker threads inherit the caller's deadline
+            return self.generate_text(prompt, temperature=temperature, max_tokens=max_tokens,
+                                      model_choice=model_choice, timeout_s=timeout_s)
+
+        max_concurrency = LLM_BATCH_MAX_CONCURRENCY_BY_PROVIDER.get(model_choice, LLM_BATCH_MAX_CONCURRENCY)
+        max_workers = min(len(prompts), max_concurrency)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_generate, prompts))
+
     def embed_text(self, text: str, model_choice: str = "gemini") -> list[float] | None:
         """
         Generates embeddings for text, used for similarity checks (deduplication).
         """
+        provider = self._provider(model_choice)
+        if provider is None:
+            logger.error(f"Embedding model '{model_choice}' not configured or invalid choice.")
+            return None
+        # No failover for embeddings: vectors from another provider's model aren't comparable
+        if _circuit_open(model_choice, "embedding"):
+            return None
         try:
-            if model_choice == "gemini" and self.gemini_model:
-                response = self.gemini_model.embed_content(
-                    model='models/embedding-001',  # Specific embedding model
-                    content=text
-                )
-                return response['embedding']
-            elif model_choice == "openai" and self.openai_client:
-                response = self.openai_client.embeddings.create(
-                    model="text-embedding-ada-002",  # Or newer embedding models
-                    input=text
-                )
-                return response.data[0].embedding
-            else:
-                logger.error(f"Embedding model '{model_choice}' not configured or invalid choice.")
-                return None
+            embedding = provider.embed(text)
+            _record_outcome(model_choice)
+            return embedding
         except Exception as e:
+            _record_outcome(model_choice, e)
             logger.error(f"Error generating embedding with {model_choice}: {e}")
             return None
 
+    def embed_text_batch(self, texts: list[str], model_choice: str = "gemini") -> np.ndarray:
+        """
+        Generates embeddings for several texts with as few API requests as possible
+        (up to EMBEDDING_BATCH_MAX_INPUTS per request, sent concurrently like `generate_batch`).
+        Returns one contiguous float32 array of shape
+        (len(texts), EMBEDDING_DIM), rows in the same order as `texts`, ready for matrix similarity ops.
+        Rows of texts whose request failed are NaN.
+        """
+        results = np.full((len(texts), EMBEDDING_DIM), np.nan, dtype=np.float32)
+        provider = self._provider(model_choice)
+        if provider is None:
+            logger.error(f"Embedding model '{model_choice}' not configured or invalid choice.")
+            return results
+
+        chunk_size = EMBEDDING_BATCH_MAX_INPUTS[model_choice]
+        deadline_at = getattr(_deadline, "at", None)
+
+        def _embed_chunk(start: int) -> None:
+            _deadline.at = deadline_at  # Worker threads inherit the caller's deadline
+            chunk = texts[start:start + chunk_size]
+            if _circuit_open(model_choice, f"{len(chunk)} embeddings"):  # No failover, as in embed_text
+                return
+            try:
+                results[start:start + len(chunk)] = provider.embed(chunk)  # Copied straight into the float32 rows
+                _record_outcome(model_choice)
+            except Exception as e:
+                _record_outcome(model_choice, e)
+                logger.error(f"Error generating {len(chunk)} embeddings with {model_choice}: {e}")
+
+        starts = range(0, len(texts), chunk_size)
+        if len(starts) <= 1:
+            for start in starts:
+                _embed_chunk(start)
+            return results
+        max_concurrency = LLM_BATCH_MAX_CONCURRENCY_BY_PROVIDER.get(model_choice, LLM_BATCH_MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=min(len(starts), max_concurrency)) as executor:
+            list(executor.map(_embed_chunk, starts))  # Each chunk fills its own rows of `results`
+        return results
+
+    # --- OpenAI Batch API (asynchronous bulk jobs: half the price, outside the RPM/TPM limits) ---
 
+    def submit_openai_batch(self, prompts: dict[str, str], temperature: float = 0.7,
+                            max_tokens: int = 2000) -> str | None:
+        """
+        Submits prompts (custom_id -> prompt) as one OpenAI Batch API job, completed within 24 hours.
+        Meant for non-interactive bulk work; collect the results later with `poll_openai_batch`.
+        Returns the batch ID, or None if submission failed.
+        """
+        if not self.openai_client or not prompts:
+            logger.error("OpenAI not configured or no prompts. Cannot submit a batch job.")
+            return None
+        jsonl = b"\n".join(orjson.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": self.openai_model, "messages": [{"role": "user", "content": prompt}],
+                     "temperature": temperature, "max_tokens": max_tokens},
+        }) for custom_id, prompt in prompts.items())
+        try:
+            input_file = self.openai_client.files.create(file=("batch.jsonl", jsonl), purpose="batch")
+            batch = self.openai_client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions",
+                                                      completion_window="24h")
+            logger.info(f"Submitted OpenAI batch {batch.id} with {len(prompts)} prompts.")
+            return batch.id
+        except Exception as e:
+            logger.error(f"Error submitting OpenAI batch of {len(prompts)} prompts: {e}")
+            return None
+
+    def poll_openai_batch(self, batch_id: str) -> dict[str, str | None] | None:
+        """
+        Checks an OpenAI batch job without blocking. Returns None while the job is still running, otherwise
+        {custom_id: text, or None for a request that failed}, merging the job's output and error files.
+        Raises if the status check or result download fails, so callers can tell that apart from "running".
+        """
+        try:
+            batch = self.openai_client.batches.retrieve(batch_id)
+            if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+                return None
+            results = {}
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for line in self.openai_client.files.content(file_id).content.splitlines():
+                    item = orjson.loads(line)
+                    response = item.get("response") or {}
+                    if response.get("status_code") == 200:
+                        results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                    else:
+                        results[item["custom_id"]] = None
+        except Exception as e:
+            logger.error(f"Error polling OpenAI batch {batch_id}: {e}")
+            raise
+        if not results:
+            logger.error(f"OpenAI batch {batch_id} ended with status '{batch.status}' and no results.")
+        return results
 
 
+@lru_cache(maxsize=1)
+def get_llm_interface() -> LLMInterface:
+    """Returns the process-wide LLMInterface, so all agents share its provider clients and connection pools."""
+    return LLMInterface()
@@ -1,6 +1,28 @@
 # utils/logger.py
 import logging
 import sys
+import orjson
+from config.settings import LOG_FORMAT
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as one JSON object per line ({"ts", "lvl", "name", "msg"[, "exc"]}), serialized with
+    orjson, so log collectors get structured fields without re-parsing text. `ts` is the raw epoch timestamp.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": record.created, "lvl": record.levelname, "name": record.name, "msg": record.getMessage()}
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+# One formatter and stdout handler shared by all loggers, instead of new ones per setup_logger call
+_FORMATTER = JsonFormatter() if LOG_FORMAT == "json" else \
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_HANDLER = logging.StreamHandler(sys.stdout)
+_HANDLER.setFormatter(_FORMATTER)
 
 
 def setup_logger(name, level=logging.INFO):
@@ -8,16 +30,10 @@ def setup_logger(name, level=logging.INFO):
     Sets up a standardized logger for agents and services.
     Logs to stdout, which Docker captures.
     """
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(formatter)
-
     logger = logging.getLogger(name)
     logger.setLevel(level)
     # Prevent duplicate handlers if called multiple times for the same logger name
     if not logger.handlers:
-        logger.addHandler(handler)
+        logger.addHandler(_HANDLER)
+    logger.propagate = False  # Don't emit records a second time through root handlers (e.g. Celery's)
     return logger
-
-
@@ -1,6 +1,42 @@
 # utils/prompt_templates.py
 # This module centralizes all LLM prompt templates.
 # Using f-strings for easy variable injection.
+from string import Formatter
+
+
+def make_formatter(template: str, **bound):
+    """
+    Pre-parses a str.format-style template once and returns a `render(**kwargs) -> str` callable.
+    Rendering only fills the placeholder slots of the pre-split template and joins it, instead of
+    re-scanning the whole (multi-KB) template and its {{ }} escapes on every call like str.format.
+    Placeholders given in `bound` (values fixed for the process, e.g. the niche topic) are folded
+    into the static text here, so `render` only takes the remaining ones.
+    Only plain `{name}` placeholders are supported.
+    """
+    parts = []
+    field_slots = []  # (index into parts, field name)
+    for literal, field_name, format_spec, conversion in Formatter().parse(template):
+        if field_name is not None and (format_spec or conversion or not field_name.isidentifier()):
+            raise ValueError(f"Unsupported placeholder in prompt template: {{{field_name}}}")
+        if field_name in bound:
+            literal += str(bound[field_name])
+        if literal:
+            if parts and not (field_slots and field_slots[-1][0] == len(parts) - 1):
+                parts[-1] += literal  # Merge with the preceding static text
+            else:
+                parts.append(literal)
+        if field_name is not None and field_name not in bound:
+            field_slots.append((len(parts), field_name))
+            parts.append("")
+
+    def render(**kwargs) -> str:
+        rendered = parts.copy()
+        for index, field_name in field_slots:
+            rendered[index] = str(kwargs[field_name])
+        return "".join(rendered)
+
+    return render
+
 
 # --- Data Ingestion & Parsing Prompts ---
 NICHE_SCHEMA_PROMPT_SOLAR_PUMP_RAJA = """
@@ -37,15 +73,27 @@ Example JSON structure:
 }}
 """
 
+RAW_DATA_EXTRACTION_PROMPT = """You are an expert in agricultural technology and government schemes in Rajasthan.
+Extract the following structured information from the provided text, focusing specifically on small-scale solar pump systems, their maintenance, troubleshooting, and relevant government schemes for farmers in Rajasthan.
+
+**Niche Schema:**
+{niche_schema}
+
+**Raw Text Content:**
+{raw_text}
+
+Return the extracted data as a single JSON object. If a field is not found, omit that field from the JSON.
+"""
+
 # --- Content Generation Prompts ---
+# Templates keep their fixed instructions first and per-call data last: identical prompt prefixes are
+# served from the provider's prompt cache (e.g. OpenAI caches prefixes of 1024+ tokens automatically).
+# Per-process values (lengths, disclaimer, niche topic) are bound with make_formatter so the prefix stays byte-identical.
+# The language variants of a template share the same placeholders, so callers render them interchangeably.
 
 ARTICLE_GENERATION_PROMPT_HI = """
 आप राजस्थान के किसानों के लिए कृषि प्रौद्योगिकी के विशेषज्ञ तकनीकी लेखक हैं।
-आपका कार्य निम्नलिखित संरचित डेटा के बारे आधार पर सौर पंप प्रणालियों के लिए एक व्यापक, अत्यधिक व्यावहारिक और आसानी से समझ में आने वाली मार्गदर्शिका हिंदी में तैयार करना है:
----
-डेटा: {structured_data_json}
----
-मुख्य शब्द (हिंदी): {seo_keywords_hindi}
+आपका कार्य नीचे दिए गए संरचित डेटा के आधार पर सौर पंप प्रणालियों के लिए एक व्यापक, अत्यधिक व्यावहारिक और आसानी से समझ में आने वाली मार्गदर्शिका हिंदी में तैयार करना है।
 
 **निर्देश:**
 1.  **शीर्षक:** एक आकर्षक और कीवर्ड-समृद्ध शीर्षक हिंदी में बनाएं।
@@ -60,16 +108,17 @@ ARTICLE_GENERATION_PROMPT_HI = """
 7.  **न्यूनतम लंबाई:** कम से कम {min_length} शब्दों का लक्ष्य रखें।
 8.  **एआई अस्वीकरण:** लेख के अंत में, स्पष्ट रूप से दिखाई देने वाला निम्नलिखित अस्वीकरण शामिल करें: "{ai_disclaimer_text}"।
 
+---
+डेटा: {structured_data_json}
+---
+मुख्य शब्द (हिंदी): {seo_keywords}
+
 आपका उत्पन्न किया गया लेख:
 """
 
 ARTICLE_GENERATION_PROMPT_EN = """
 You are an expert technical writer specializing in agricultural technology for farmers in Rajasthan.
-Your task is to create a comprehensive, highly practical, and easy-to-understand guide in English about the following structured data:
----
-Data: {structured_data_json}
----
-Target Keywords (English): {seo_keywords_english}
+Your task is to create a comprehensive, highly practical, and easy-to-understand guide in English about the structured data given below.
 
 **Instructions:**
 1.  **Title:** Create a compelling and keyword-rich title in English.
@@ -84,6 +133,11 @@ Target Keywords (English): {seo_keywords_english}
 7.  **Minimum Length:** Aim for at least {min_length} words.
 8.  **AI Disclaimer:** Include the following at the very end of the article, clearly visible: "{ai_disclaimer_text}".
 
+---
+Data: {structured_data_json}
+---
+Target Keywords (English): {seo_keywords}
+
 Your generated article:
 """
 
@@ -102,6 +156,14 @@ Example:
 Article content: {article_text}
 """
 
+ARTICLE_COVERAGE_CHECK_PROMPT = """
+Does the following article cover all the key points from this structured data? Respond with YES/NO.
+
+Article: {article_text}
+
+Data: {structured_data_json}
+"""
+
 VIDEO_SCRIPT_SUMMARY_PROMPT = """
 Summarize the key information from the following article into a concise, engaging video script (max {max_duration_seconds} seconds) suitable for farmers in Rajasthan.
 The script should be in {language_name} and include clear, simple sentences suitable for narration.
@@ -112,7 +174,7 @@ Article: {article_text}
 
 # --- SEO Prompts ---
 SEO_OPTIMIZATION_PROMPT = """
-Given the following article content and its primary topic '{article_title}',
+Given the article content and its primary topic (both provided at the end),
 suggest an optimized meta title (max 60 chars), meta description (max 160 chars),
 and identify 3-5 relevant internal linking opportunities (i.e., keywords/phrases within the article
 that could link to another relevant article within the '{niche_topic}' domain).
@@ -127,9 +189,33 @@ Return as JSON:
   ]
 }}
 
+Primary topic: {article_title}
+
 Article content: {article_text}
 """
 
+SEO_OPTIMIZATION_BATCH_PROMPT = """
+For each of the following articles in the '{niche_topic}' domain (given as a JSON array of objects
+with "id", "title" and "text"), suggest an optimized meta title (max 60 chars), meta description (max 160 chars),
+and identify 3-5 relevant internal linking opportunities (i.e., keywords/phrases within the article
+that could link to another relevant article within the '{niche_topic}' domain).
+For internal links, suggest the 'keyword' and a 'target_topic' that it would link to.
+Return a single JSON object keyed by each article's "id" (as a string):
+{{
+  "<id>": {{
+    "meta_title": "...",
+    "meta_description": "...",
+    "internal_links": [
+      {{"keyword": "...", "target_topic": "..."}},
+      ...
+    ]
+  }},
+  ...
+}}
+
+Articles: {articles_json}
+"""
+
 # --- Monetization Prompts ---
 AFFILIATE_LINK_OPPORTUNITY_PROMPT = """
 Identify opportunities within the following article to naturally integrate Amazon India affiliate links for products related to small-scale solar pump systems (e.g., solar panels, small pumps, batteries, wiring, tools, maintenance kits).
@@ -155,8 +241,6 @@ SEO (e.g., "Prioritize Y keywords"), and distribution (e.g., "Publish more on Z
 Consider the costs associated with LLM calls and content generation to ensure profitability.
 Prioritize directives that maximize revenue and traffic efficiency.
 
-Data: {performance_data_json}
-
 Return directives as a JSON list, e.g.:
 {{
     "directives": [
@@ -165,4 +249,17 @@ Return directives as a JSON list, e.g.:
         {{"agent": "monetization_feedback", "action": "adjust_ad_density", "pages_type": "high_traffic"}}
     ]
 }}
+
+Data: {performance_data_json}
 """
+
+# --- Precompiled Templates ---
+# Hot-path renderers built once at import time (see make_formatter).
+# The niche schema is itself a format template (escaped braces), so it is rendered once here
+# and bound into the extraction prompt.
+NICHE_SCHEMA_SOLAR_PUMP_RAJA = make_formatter(NICHE_SCHEMA_PROMPT_SOLAR_PUMP_RAJA)()
+RAW_DATA_EXTRACTION_PROMPT_FN = make_formatter(RAW_DATA_EXTRACTION_PROMPT, niche_schema=NICHE_SCHEMA_SOLAR_PUMP_RAJA)
+IMAGE_PROMPT_GENERATION_PROMPT_FN = make_formatter(IMAGE_PROMPT_GENERATION_PROMPT)
+ARTICLE_COVERAGE_CHECK_PROMPT_FN = make_formatter(ARTICLE_COVERAGE_CHECK_PROMPT)
+AFFILIATE_LINK_OPPORTUNITY_PROMPT_FN = make_formatter(AFFILIATE_LINK_OPPORTUNITY_PROMPT)
+PERFORMANCE_ANALYSIS_PROMPT_FN = make_formatter(PERFORMANCE_ANALYSIS_PROMPT)
@@ -0,0 +1,53 @@
+# utils/rate_limiter.py
+import threading
+import time
+from config.settings import GEMINI_REQUESTS_PER_MINUTE, OPENAI_REQUESTS_PER_MINUTE, \
+    WORDPRESS_REQUESTS_PER_MINUTE, RAZORPAY_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket for proactive client-side rate limiting.
+    Holds up to `capacity` tokens (default: one period's worth) refilled continuously at `rate` per `period`
+    seconds. `acquire` blocks until enough tokens are available, so callers wait instead of hitting 429s.
+    """
+
+    def __init__(self, rate: float, period: float = 60.0, capacity: float | None = None):
+        self.capacity = capacity if capacity is not None else rate
+        self._refill_per_second = rate / period
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self._refill_per_second)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Blocks until `tokens` tokens are available, then consumes them."""
+        tokens = min(tokens, self.capacity)  # A request larger than the bucket waits for a full bucket
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self._refill_per_second
+            time.sleep(wait_seconds)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count for budgeting (~4 characters per token for English; Hindi text under-counts)."""
+    return len(text) // 4 + 1
+
+
+# Shared per-provider limiters. Buckets are per process, so each Celery worker process gets the full rate;
+# size the *_REQUESTS_PER_MINUTE settings as (provider limit / number of worker processes).
+gemini_limiter = TokenBucket(GEMINI_REQUESTS_PER_MINUTE)
+openai_limiter = TokenBucket(OPENAI_REQUESTS_PER_MINUTE)
+wordpress_limiter = TokenBucket(WORDPRESS_REQUESTS_PER_MINUTE)
+razorpay_limiter = TokenBucket(RAZORPAY_REQUESTS_PER_MINUTE)
+# LLM token budgets, acquired alongside the request limiters with the estimated prompt + output tokens
+gemini_token_limiter = TokenBucket(GEMINI_TOKENS_PER_MINUTE)
+openai_token_limiter = TokenBucket(OPENAI_TOKENS_PER_MINUTE)